@@ -0,0 +1,293 @@
+"""
+Indexed accommodation catalog for /generate-full-itinerary.
+
+The local catalog is indexed by normalized location (dict lookup), with a
+sorted key list for prefix searches (bisect) and a first-token index for
+locations mentioned inside longer text. LLM-suggested accommodations
+are merged into the catalog results per location across all days,
+deduplicated by normalized name, and their URLs are checked for
+reachability with results cached in the shared store. Only http(s) URLs
+whose host resolves to public addresses are fetched, the connection goes to
+the address that was checked (so DNS rebinding cannot swap it), and
+redirects are followed by hand so every hop is checked the same way.
+"""
+import bisect
+import ipaddress
+import json
+import logging
+import re
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import create_connection
+
+from .configs import ACCOMMODATION_CATALOG_PATH, URL_CHECK_TTL, URL_CHECK_TIMEOUT
+from .shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+PRICE_BAND_ORDER = {"budget": 0, "mid-range": 1, "luxury": 2}
+
+# Redirect hops followed when checking a URL
+MAX_REDIRECTS = 3
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase alphanumeric tokens, used as the dedup/index key"""
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+class AccommodationCatalog:
+    """Accommodations indexed by location"""
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self._by_location: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            loc_key = normalize_name(entry["location"])
+            item = {
+                "name": entry["name"],
+                "url": entry.get("url", ""),
+                "category": entry.get("category", ""),
+                "price_band": entry.get("price_band", ""),
+                "source": "catalog",
+            }
+            self._by_location.setdefault(loc_key, []).append(item)
+        for items in self._by_location.values():
+            items.sort(key=lambda i: PRICE_BAND_ORDER.get(i["price_band"], len(PRICE_BAND_ORDER)))
+        self._locations = sorted(self._by_location)
+        # First token -> locations starting with it (longest first), for locations inside longer text
+        self._by_first_token: Dict[str, List[List[str]]] = {}
+        for loc in sorted(self._by_location, key=lambda l: -len(l.split())):
+            tokens = loc.split()
+            self._by_first_token.setdefault(tokens[0], []).append(tokens)
+
+    @classmethod
+    def load(cls, path: str = ACCOMMODATION_CATALOG_PATH) -> "AccommodationCatalog":
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Failed to load accommodation catalog from {path}: {str(e)}")
+            return cls([])
+
+    def resolve_location(self, location: str) -> Optional[str]:
+        """Map a free-text location to a catalog location key.
+
+        Tries an exact match, then a catalog location that prefixes the text
+        (bisect over sorted keys), then the first catalog location mentioned
+        in it (a first-token index lookup per word of the text).
+        """
+        key = normalize_name(location)
+        if key in self._by_location:
+            return key
+        i = bisect.bisect_right(self._locations, key)
+        if i and key.startswith(self._locations[i - 1] + " "):
+            return self._locations[i - 1]
+        words = key.split()
+        for i, word in enumerate(words):
+            for tokens in self._by_first_token.get(word, ()):
+                if words[i:i + len(tokens)] == tokens:
+                    return " ".join(tokens)
+        return None
+
+    def for_location(self, location: str) -> List[Dict[str, Any]]:
+        loc_key = self.resolve_location(location)
+        return list(self._by_location.get(loc_key, [])) if loc_key else []
+
+
+def resolve_public_address(url: str) -> Optional[str]:
+    """The address to connect to for a URL, if it is http(s) and its host resolves only to public addresses.
+
+    Keeps the validator from being pointed at loopback, private, link-local
+    (e.g. cloud metadata) or other internal addresses by LLM output.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return None
+    try:
+        infos = socket.getaddrinfo(parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80))
+    except (socket.gaierror, UnicodeError, ValueError):
+        return None
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            return None
+    return infos[0][4][0] if infos else None
+
+
+class _PinnedConnection:
+    """Connection mixin that connects to pinned_address instead of resolving the host again"""
+
+    pinned_address = ""
+
+    def _new_conn(self) -> socket.socket:
+        try:
+            return create_connection((self.pinned_address, self.port), self.timeout,
+                                     source_address=self.source_address, socket_options=self.socket_options)
+        except socket.timeout as e:
+            raise ConnectTimeoutError(self, f"Connection to {self.host} timed out") from e
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+
+class _PinnedAdapter(HTTPAdapter):
+    """Sends every request to one already-checked address.
+
+    The URL's host is still used for the Host header, TLS SNI and
+    certificate verification; only the DNS lookup is replaced.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        super().__init__()
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        pinned = {"pinned_address": self.address}
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("PinnedHTTPConnectionPool", (HTTPConnectionPool,), {
+                "ConnectionCls": type("PinnedHTTPConnection", (_PinnedConnection, HTTPConnection), pinned),
+            }),
+            "https": type("PinnedHTTPSConnectionPool", (HTTPSConnectionPool,), {
+                "ConnectionCls": type("PinnedHTTPSConnection", (_PinnedConnection, HTTPSConnection), pinned),
+            }),
+        }
+
+
+class URLValidator:
+    """URL reachability checks with results cached for URL_CHECK_TTL"""
+
+    namespace = "url_check"
+
+    def __init__(self, ttl: int = URL_CHECK_TTL, timeout: float = URL_CHECK_TIMEOUT, max_workers: int = 8):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.store = get_shared_store()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="url-check")
+
+    def _request(self, method: str, url: str) -> Optional[requests.Response]:
+        """Send a request to the checked address, following redirects only to public URLs"""
+        for _ in range(MAX_REDIRECTS + 1):
+            address = resolve_public_address(url)
+            if address is None:
+                return None
+            with requests.Session() as session:
+                # No proxies: the connection must go to the checked address itself
+                session.trust_env = False
+                adapter = _PinnedAdapter(address)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                response = session.request(method, url, timeout=self.timeout, allow_redirects=False, stream=True)
+                response.close()
+            if not response.is_redirect:
+                return response
+            url = urljoin(url, response.headers["location"])
+        return None
+
+    def _check(self, url: str) -> bool:
+        try:
+            response = self._request("HEAD", url)
+            if response is not None and response.status_code in (403, 405):
+                # Some servers reject HEAD; fall back to a streamed GET
+                response = self._request("GET", url)
+            return response is not None and response.status_code < 400
+        except requests.RequestException:
+            return False
+
+    def check_many(self, urls: List[str]) -> Dict[str, bool]:
+        """Reachability for each URL; only URLs without a cached result are fetched, concurrently"""
+        results = {}
+        unchecked = []
+        for url in set(urls):
+            cached = self.store.get(self.namespace, url)
+            if cached is not None:
+                results[url] = cached[0] == b"1"
+            else:
+                unchecked.append(url)
+        for url, ok in zip(unchecked, self._executor.map(self._check, unchecked)):
+            self.store.set(self.namespace, url, b"1" if ok else b"0", self.ttl)
+            results[url] = ok
+        return results
+
+
+def _suggested_items(day: Dict[str, Any]) -> List[Dict[str, Any]]:
+    items = []
+    for acc in day.get("accommodations") or []:
+        if isinstance(acc, dict) and acc.get("name"):
+            items.append({"name": acc["name"], "url": acc.get("url") or ""})
+        elif isinstance(acc, str) and acc.strip():
+            items.append({"name": acc.strip(), "url": ""})
+    return items
+
+
+def build_hotels_by_location(itinerary: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Aggregate accommodations per location across all days.
+
+    Catalog entries for each location come first; LLM suggestions that match
+    a catalog entry are replaced by it, other suggestions are kept (marked
+    "suggested") with their URL dropped if it is unreachable.
+    """
+    catalog = get_accommodation_catalog()
+    hotels: Dict[str, List[Dict[str, Any]]] = {}
+    seen: Dict[str, set] = {}
+    suggestions = []
+
+    # Days whose locations resolve to the same catalog location share one group,
+    # shown under the first spelling seen
+    display: Dict[str, str] = {}
+
+    for day in itinerary:
+        raw_loc = day.get("location") or "Unknown"
+        group = catalog.resolve_location(raw_loc) or normalize_name(raw_loc)
+        if group not in display:
+            loc = display[group] = raw_loc
+            hotels[loc] = []
+            seen[loc] = set()
+            for item in catalog.for_location(raw_loc):
+                hotels[loc].append(dict(item))
+                seen[loc].add(normalize_name(item["name"]))
+        loc = display[group]
+        for item in _suggested_items(day):
+            key = normalize_name(item["name"])
+            if key in seen[loc]:
+                continue
+            seen[loc].add(key)
+            item.update(category="", price_band="", source="suggested")
+            hotels[loc].append(item)
+            suggestions.append(item)
+
+    urls = [item["url"] for item in suggestions if item["url"]]
+    if urls:
+        reachable = get_url_validator().check_many(urls)
+        for item in suggestions:
+            if item["url"] and not reachable.get(item["url"], False):
+                item["url"] = ""
+    return hotels
+
+
+# Create global instances
+accommodation_catalog = None
+url_validator = None
+
+def get_accommodation_catalog() -> AccommodationCatalog:
+    """Get or load the accommodation catalog."""
+    global accommodation_catalog
+    if accommodation_catalog is None:
+        accommodation_catalog = AccommodationCatalog.load()
+    return accommodation_catalog
+
+def get_url_validator() -> URLValidator:
+    """Get or create the URL validator instance."""
+    global url_validator
+    if url_validator is None:
+        url_validator = URLValidator()
+    return url_validator
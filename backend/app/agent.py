@@ -1,16 +1,34 @@
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_groq import ChatGroq
 from langchain_tavily import TavilySearch
 from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage, AIMessage
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 import json
 import logging
-from .configs import GROQ_API_KEY, TAVILY_API_KEY
+import time
+from .configs import (
+    GROQ_API_KEY, TAVILY_API_KEY, SEARCH_CACHE_TTL,
+    AGENT_MAX_ITERATIONS, RATE_LIMIT_MAX_WAIT, AGENT_RUN_LLM_CALLS,
+)
+from .llm_router import get_llm_router, RoutedChatModel, current_tier, LLMRouterError
+from .tiering import get_tiering_policy, SMALL, LARGE
+from .itinerary import parse_itinerary, summarize_itinerary
+from .rate_limit import (
+    get_rate_limiter, current_priority, current_run_budget, estimate_run_tokens, RateLimitExceeded, INTERACTIVE,
+)
+from .circuit_breaker import get_breaker, OPEN
+from .shared_store import get_shared_store
+from .sessions import merge_days, summarize_other_days
+from .deadline import Deadline, DeadlineExceeded, RequestCancelled, current_deadline, wait_for, SEARCH
+from .profiling import in_context
 
 logger = logging.getLogger(__name__)
 
+# Searches run here so that a request deadline can stop waiting for them
+search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+
 @tool
 def search_sikkim_attractions(query: str) -> str:
     """Search for attractions and information about Sikkim travel destinations."""
@@ -18,13 +36,52 @@ def search_sikkim_attractions(query: str) -> str:
         if not TAVILY_API_KEY:
             return "Tavily API key not configured. Using fallback information."
         
+        # Search results are shared across workers through the cache store
+        store = get_shared_store()
+        cache_key = " ".join(query.lower().split())
+        cached = store.get("search", cache_key)
+        if cached is not None:
+            return cached[0].decode("utf-8")
+        
+        # Skip the search entirely while the search provider is unhealthy
+        deadline = current_deadline.get()
+        breaker = get_breaker("search")
+        if not breaker.allow_request():
+            return "Search temporarily unavailable. Use general knowledge about Sikkim."
+        
+        # Reserve the search against the Tavily budget; without capacity, carry on without results
+        try:
+            get_rate_limiter().reserve_search(max_wait=min(
+                RATE_LIMIT_MAX_WAIT, deadline.remaining() if deadline is not None else RATE_LIMIT_MAX_WAIT
+            ))
+        except RateLimitExceeded:
+            breaker.record_abandoned()
+            return "Search rate limit reached. Use general knowledge about Sikkim."
+        
         search = TavilySearch(
             api_key=TAVILY_API_KEY,
             max_results=5,
             search_depth="basic"
         )
         
-        results = search.invoke(query)
+        start = time.monotonic()
+        try:
+            if deadline is None:
+                results = search.invoke(query)
+            else:
+                results = wait_for(search_executor.submit(in_context(search.invoke), query), deadline, SEARCH)
+        except DeadlineExceeded:
+            # The provider did not answer in time; let the agent carry on without results
+            breaker.record_timeout()
+            logger.warning(f"Search for '{query}' exceeded its time budget")
+            return "Search timed out. Use general knowledge about Sikkim."
+        except RequestCancelled:
+            breaker.record_abandoned()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success(time.monotonic() - start)
         
         # Format results as a readable string
         formatted_results = []
@@ -34,8 +91,15 @@ def search_sikkim_attractions(query: str) -> str:
             if title and content:
                 formatted_results.append(f"{title}: {content[:200]}...")
         
-        return "\n".join(formatted_results) if formatted_results else "No search results found."
+        if not formatted_results:
+            return "No search results found."
+        
+        formatted = "\n".join(formatted_results)
+        store.set("search", cache_key, formatted.encode("utf-8"), SEARCH_CACHE_TTL)
+        return formatted
     
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
         return f"Search failed: {str(e)}"
@@ -47,12 +111,6 @@ def generate_detailed_itinerary(preference: str, days: int, search_data: str) ->
         if not GROQ_API_KEY:
             return json.dumps({"error": "GROQ API key not configured"})
         
-        llm = ChatGroq(
-            model_name="llama3-70b-8192",
-            api_key=GROQ_API_KEY,
-            temperature=0.7
-        )
-        
         prompt = f"""
         You are an expert Sikkim travel planner. Create a detailed {days}-day itinerary based on the preference: {preference}.
         
@@ -83,12 +141,19 @@ def generate_detailed_itinerary(preference: str, days: int, search_data: str) ->
         - Return ONLY valid JSON, no additional text or explanations
         """
         
-        response = llm.invoke(prompt)
+        response = get_llm_router().invoke(
+            prompt,
+            validate=lambda r: bool(r.content and r.content.strip())
+        )
         content = response.content.strip()
         
         # Validate JSON
         try:
             json.loads(content)
+            # Keep it in case the agent runs out of time before its final answer
+            deadline = current_deadline.get()
+            if deadline is not None:
+                deadline.partial_output = content
             return content
         except json.JSONDecodeError:
             # If JSON is invalid, return a fallback
@@ -107,20 +172,22 @@ def generate_detailed_itinerary(preference: str, days: int, search_data: str) ->
                 "accommodation": "Hotel in Gangtok"
             }])
     
+    except (DeadlineExceeded, RequestCancelled):
+        raise
     except Exception as e:
         logger.error(f"Itinerary generation error: {str(e)}")
         return json.dumps({"error": f"Itinerary generation failed: {str(e)}"})
 
+class InvalidPatchError(Exception):
+    """Raised when the model's edit of an itinerary cannot be used"""
+
 class TravelAgent:
     def __init__(self):
         if not GROQ_API_KEY:
             raise ValueError("GROQ API key not configured")
         
-        self.llm = ChatGroq(
-            model_name="llama3-70b-8192",
-            api_key=GROQ_API_KEY,
-            temperature=0.7
-        )
+        # Route agent LLM calls through the hedging/failover layer
+        self.llm = RoutedChatModel(router=get_llm_router())
         
         # Create tools
         self.tools = [search_sikkim_attractions, generate_detailed_itinerary]
@@ -156,13 +223,85 @@ Instructions:
         ])
         # Create agent
         self.agent = create_openai_tools_agent(self.llm, self.tools, self.prompt)
-        self.agent_executor = AgentExecutor(agent=self.agent, tools=self.tools, verbose=True)
+        self.agent_executor = AgentExecutor(
+            agent=self.agent,
+            tools=self.tools,
+            verbose=True,
+            max_iterations=AGENT_MAX_ITERATIONS
+        )
     
-    def generate_itinerary(self, preference: str, days: int) -> Dict[str, Any]:
-        """Generate a travel itinerary using the agent."""
+    def _fallback_result(self, preference: str, days: int, note: str) -> Dict[str, Any]:
+        """Build a successful result from the deterministic fallback generator."""
+        from .fallback import get_fallback_itinerary
+        itinerary = parse_itinerary(get_fallback_itinerary(preference, days))
+        return {
+            "success": True,
+            "itinerary": itinerary,
+            **summarize_itinerary(itinerary),
+            "preference": preference,
+            "days": days,
+            "note": note
+        }
+
+    def _partial_result(self, preference: str, days: int, deadline: Deadline, reason: str) -> Dict[str, Any]:
+        """Best result available when the agent run was cut short.
+
+        Uses the last itinerary the generation tool produced, otherwise the
+        deterministic fallback. Either way the result carries a note, so it
+        is not cached.
+        """
+        if deadline.partial_output:
+            itinerary_data, _ = self._parse_itinerary(deadline.partial_output)
+            if itinerary_data:
+                return {
+                    "success": True,
+                    "itinerary": itinerary_data,
+                    **summarize_itinerary(itinerary_data),
+                    "preference": preference,
+                    "days": days,
+                    "note": f"Generated from the agent's last draft because {reason}"
+                }
+        return self._fallback_result(preference, days, f"Generated using fallback because {reason}")
+
+    def _parse_itinerary(self, response_content: str, days: Optional[int] = None):
+        """Extract the itinerary JSON from the agent output and validate it.
+
+        The JSON inside a ```json fence (or between the outermost brackets)
+        goes to the TypeAdapter as is, so validation, normalization and the
+        day-count check happen in one pass. Returns (itinerary_data, None)
+        on success or (None, error_message).
+        """
+        json_str = response_content.strip()
+        fence = json_str.find("```")
+        if fence != -1:
+            body_start = json_str.find("\n", fence) + 1
+            body_end = json_str.find("```", body_start)
+            if body_start and body_end != -1:
+                json_str = json_str[body_start:body_end].strip()
+        if not json_str.startswith("["):
+            start, end = json_str.find("["), json_str.rfind("]")
+            if start != -1 and end > start:
+                json_str = json_str[start:end + 1]
         try:
-            # Create the input for the agent
-            agent_input = f"""
+            return parse_itinerary(json_str, days), None
+        except Exception as e:
+            logger.error(f"JSON parsing error: {str(e)} | Raw: {response_content}")
+            return None, f"Invalid JSON format: {str(e)}"
+
+    def _run_tier(self, tier: str, preference: str, days: int, deadline: Deadline,
+                  seed: Optional[Dict[str, Any]] = None):
+        """Run the agent with the given model tier within the request deadline.
+
+        A seed (a cached result for a similar preference) is summarized into
+        the input as a starting point. Returns (response_content,
+        itinerary_data, error) and records provider and validation failures
+        in the tier stats. Raises
+        RateLimitExceeded if the run's estimated budget is not admitted.
+        """
+        policy = get_tiering_policy()
+
+        # Create the input for the agent
+        agent_input = f"""
             Create a {days}-day travel itinerary for Sikkim based on this preference: {preference}
             
             Please:
@@ -170,63 +309,208 @@ Instructions:
             2. Generate a detailed itinerary with daily activities, locations, and descriptions
             3. Return the final itinerary as JSON
             """
-            
+        if seed:
+            agent_input += f"""
+            An itinerary for a similar request ("{seed['preference']}") is summarized below.
+            Reuse what fits this preference and replace what does not:
+            {summarize_other_days(seed['itinerary'], [])}
+            """
+
+        # Admit the run against its estimated budget before the first call, so it is rejected
+        # up front rather than halfway; the run's LLM calls then draw from this budget
+        budget = get_rate_limiter().admit_run(
+            get_llm_router().backends_for(tier)[0].provider, AGENT_RUN_LLM_CALLS, estimate_run_tokens(days),
+            max_wait=min(RATE_LIMIT_MAX_WAIT, max(0.0, deadline.remaining()))
+        )
+
+        budget_token = current_run_budget.set(budget)
+        token = current_tier.set(tier)
+        deadline_token = current_deadline.set(deadline)
+        # The executor stops between steps once the time is up; the deadline bounds the step in flight
+        agent_executor = self.agent_executor.model_copy(update={"max_execution_time": deadline.remaining()})
+        start = time.monotonic()
+        try:
             # Execute the agent
-            result = self.agent_executor.invoke({
+            result = agent_executor.invoke({
                 "input": agent_input,
                 "chat_history": []
             })
-            
-            # Extract the response
-            response_content = result.get("output", "")
-            
-            # Try to parse JSON from the response, attempt to fix minor issues
-            import re
-            try:
-                # Extract JSON array from response
-                match = re.search(r'(\[.*\])', response_content, re.DOTALL)
-                if match:
-                    json_str = match.group(1)
-                else:
-                    json_str = response_content.strip()
-                # Attempt to fix common issues
-                json_str = json_str.replace("\'", '"')
-                # Remove trailing commas
-                json_str = re.sub(r',\s*([}\]])', r'\1', json_str)
-                itinerary_data = json.loads(json_str)
-                return {
-                    "success": True,
-                    "itinerary": itinerary_data,
-                    "preference": preference,
-                    "days": days
-                }
-            except Exception as e:
-                logger.error(f"JSON parsing error: {str(e)} | Raw: {response_content}")
+        except (RequestCancelled, DeadlineExceeded, RateLimitExceeded):
+            # Running out of time or budget says nothing about the tier itself
+            raise
+        except Exception:
+            policy.record_result(tier, time.monotonic() - start, success=False)
+            raise
+        finally:
+            current_deadline.reset(deadline_token)
+            current_tier.reset(token)
+            current_run_budget.reset(budget_token)
+
+        # Extract the response
+        response_content = result.get("output", "")
+        itinerary_data, error = self._parse_itinerary(response_content, days)
+        # An answer cut short by the deadline is not a validation failure of the tier
+        if itinerary_data is not None or (deadline.remaining() > 0 and not deadline.cancelled):
+            policy.record_result(tier, time.monotonic() - start, success=itinerary_data is not None)
+        return response_content, itinerary_data, error
+
+    def generate_itinerary(self, preference: str, days: int, priority: int = INTERACTIVE,
+                           deadline: Optional[Deadline] = None,
+                           seed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Generate a travel itinerary using the agent.
+
+        Each tier run is admitted against its estimated LLM budget before its
+        first call and raises RateLimitExceeded if that is not available in
+        time; only calls beyond the estimate can still be rejected mid-run,
+        which returns the draft if there is one. When the
+        deadline runs out, returns the best partial or fallback result;
+        when it is cancelled, raises RequestCancelled. A seed is passed on
+        to the agent as a starting point.
+        """
+        deadline = deadline or Deadline()
+
+        # Go straight to the deterministic fallback while the LLM provider is unhealthy
+        if get_breaker("llm").state == OPEN:
+            logger.warning("LLM circuit breaker open, using fallback itinerary")
+            return self._fallback_result(preference, days, "Generated using fallback because the LLM provider is unavailable")
+
+        # The run's admission and any further provider calls reserve rate-limit budget at this priority
+        priority_token = current_priority.set(priority)
+        policy = get_tiering_policy()
+        try:
+            with policy.track():
+                tier = policy.choose(preference, days)
+                try:
+                    response_content, itinerary_data, error = self._run_tier(tier, preference, days, deadline, seed)
+                except LLMRouterError as e:
+                    if tier == LARGE:
+                        raise
+                    logger.warning(f"Small tier failed: {str(e)}")
+                    response_content, itinerary_data, error = "", None, str(e)
+
+                # Upgrade to the large model when the small model fails or its output fails validation
+                if tier == SMALL and itinerary_data is None:
+                    deadline.check("upgrade")
+                    logger.info("Small tier failed or returned invalid output, upgrading to large tier")
+                    policy.record_upgrade(SMALL)
+                    tier = LARGE
+                    response_content, itinerary_data, error = self._run_tier(tier, preference, days, deadline, seed)
+
+            if itinerary_data is None:
+                # The agent hit its time or iteration limit before a usable final answer
+                if deadline.partial_output or deadline.remaining() <= 0:
+                    return self._partial_result(preference, days, deadline, "the agent stopped before finishing")
                 return {
                     "success": False,
-                    "error": f"Invalid JSON format: {str(e)}",
+                    "error": error,
                     "raw_response": response_content
                 }
+            return {
+                "success": True,
+                "itinerary": itinerary_data,
+                **summarize_itinerary(itinerary_data),
+                "preference": preference,
+                "days": days,
+                "model_tier": tier
+            }
         
+        except RequestCancelled as e:
+            logger.info(f"Itinerary generation cancelled: {e.reason}")
+            raise
+        except RateLimitExceeded:
+            # Out of provider budget: use the draft if the run got that far, otherwise reject (HTTP 429)
+            if deadline.partial_output:
+                return self._partial_result(preference, days, deadline, "the provider rate limit was reached")
+            raise
+        except DeadlineExceeded as e:
+            logger.warning(f"{str(e)}, returning best available result")
+            return self._partial_result(preference, days, deadline, "the request deadline was reached")
         except Exception as e:
             logger.error(f"Agent execution error: {str(e)}")
             # Use fallback itinerary when agent fails
             try:
-                from .fallback import get_fallback_itinerary
-                fallback_itinerary = get_fallback_itinerary(preference, days)
-                return {
-                    "success": True,
-                    "itinerary": fallback_itinerary,
-                    "preference": preference,
-                    "days": days,
-                    "note": "Generated using fallback due to agent error"
-                }
+                return self._fallback_result(preference, days, "Generated using fallback due to agent error")
             except Exception as fallback_error:
                 logger.error(f"Fallback also failed: {str(fallback_error)}")
                 return {
                     "success": False,
                     "error": f"Agent execution failed: {str(e)}"
                 }
+        finally:
+            current_priority.reset(priority_token)
+
+    def refine_itinerary(self, preference: str, itinerary: List[Dict[str, Any]], target_days: List[int],
+                         instruction: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Regenerate only the targeted days of an itinerary and merge them back.
+
+        The LLM sees the targeted days plus a one-line summary of the others,
+        instead of running the full search-and-generate agent again. Raises
+        DeadlineExceeded/RequestCancelled if the deadline runs out or is
+        cancelled, since there is no partial edit to return.
+        """
+        deadline = deadline or Deadline()
+        targets = [day for day in itinerary if day.get("day") in target_days]
+        prompt = f"""
+        You are an expert Sikkim travel planner. A traveller whose preference is "{preference}" has a {len(itinerary)}-day itinerary.
+        Rewrite ONLY day(s) {", ".join(str(d) for d in target_days)} following this instruction: {instruction}
+        
+        Other days of the trip (stay consistent with them and do not repeat their activities):
+        {summarize_other_days(itinerary, target_days)}
+        
+        Current version of the day(s) to rewrite:
+        {json.dumps(targets)}
+        
+        Return ONLY a JSON array with one object per rewritten day, keeping the same structure and "day" numbers.
+        No additional text or explanations.
+        """
+
+        policy = get_tiering_policy()
+        router = get_llm_router()
+
+        def request_patch(tier: str) -> Optional[List[Dict[str, Any]]]:
+            # The patch is checked here rather than by the router, so a bad edit is
+            # a tier failure but never counts against the provider's circuit breaker
+            start = time.monotonic()
+            try:
+                response = router.invoke(prompt, backends=router.backends_for(tier))
+            except LLMRouterError:
+                policy.record_result(tier, time.monotonic() - start, success=False)
+                raise
+            patch, _ = self._parse_itinerary(response.content)
+            valid = patch is not None and sorted(day["day"] for day in patch) == sorted(target_days)
+            policy.record_result(tier, time.monotonic() - start, success=valid)
+            if not valid:
+                logger.warning(f"{tier} tier returned an invalid patch for day(s) {target_days}")
+            return patch if valid else None
+
+        deadline_token = current_deadline.set(deadline)
+        try:
+            with policy.track():
+                tier = policy.choose(preference, len(target_days))
+                try:
+                    patch = request_patch(tier)
+                except LLMRouterError:
+                    if tier == LARGE:
+                        raise
+                    patch = None
+                if patch is None and tier == SMALL:
+                    # Upgrade to the large model when the small model fails or returns a bad patch
+                    policy.record_upgrade(SMALL)
+                    tier = LARGE
+                    patch = request_patch(tier)
+        finally:
+            current_deadline.reset(deadline_token)
+        if patch is None:
+            raise InvalidPatchError(f"The model did not return a valid edit for day(s) {target_days}")
+
+        merged = merge_days(itinerary, patch)
+        return {
+            "success": True,
+            "itinerary": merged,
+            **summarize_itinerary(merged),
+            "updated_days": sorted(target_days),
+            "model_tier": tier
+        }
 
 # Create a global instance
 travel_agent = None
@@ -0,0 +1,157 @@
+"""
+Itinerary cache.
+
+Entries hold the agent result for a (preference, days) pair together with
+the pre-serialized response bodies built from it, so cache hits skip both
+generation and JSON encoding. When a shared store is configured, results are
+also written through to it so every worker process sees the same entries.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
+
+from .configs import ITINERARY_CACHE_TTL, ITINERARY_CACHE_MAX_ENTRIES
+from .responses import SerializedBody, dumps, loads
+from .shared_store import get_shared_store
+
+
+def normalize_preference(preference: str) -> str:
+    """Lowercase and collapse whitespace so trivially different inputs share a key"""
+    return " ".join((preference or "").lower().split())
+
+
+def cache_key(preference: str, days: int) -> str:
+    return f"{days}:{normalize_preference(preference)}"
+
+
+# Serialized bodies kept per entry; approximate hits can share one entry across many preferences
+MAX_BODY_VARIANTS = 16
+
+
+class CachedItinerary:
+    """Cached agent result plus serialized response bodies keyed by variant"""
+
+    def __init__(self, result: Dict[str, Any], created_at: Optional[float] = None):
+        self.result = result
+        self.created_at = created_at if created_at is not None else time.time()
+        self._bodies: Dict[str, SerializedBody] = {}
+
+    def peek(self, variant: str) -> Optional[SerializedBody]:
+        """Return the serialized body for a variant if it has already been built"""
+        return self._bodies.get(variant)
+
+    def serialized(self, variant: str, build_payload: Callable[[Dict[str, Any]], Any]) -> SerializedBody:
+        """Return the serialized body for a response variant, building it once.
+
+        Past MAX_BODY_VARIANTS, further variants are built on every call
+        rather than stored.
+        """
+        body = self._bodies.get(variant)
+        if body is None:
+            body = SerializedBody(build_payload(self.result))
+            if len(self._bodies) < MAX_BODY_VARIANTS:
+                self._bodies[variant] = body
+        return body
+
+
+class ItineraryCache:
+    """TTL + LRU bounded cache of generated itineraries.
+
+    The in-process LRU is the first level; the optional shared store is the
+    second level, consulted on a local miss.
+    """
+
+    def __init__(self, ttl: int = ITINERARY_CACHE_TTL, max_entries: int = ITINERARY_CACHE_MAX_ENTRIES,
+                 store=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _put_local(self, key: str, entry: CachedItinerary):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, preference: str, days: int) -> Optional[CachedItinerary]:
+        key = cache_key(preference, days)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.created_at > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        if self.store is not None:
+            item = self.store.get("itinerary", key)
+            if item is not None:
+                value, created_at = item
+                entry = CachedItinerary(loads(value), created_at)
+                self._put_local(key, entry)
+                self.hits += 1
+                self.shared_hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def peek(self, preference: str, days: int) -> Optional[CachedItinerary]:
+        """Like get, but without touching hit/miss stats or the LRU order of local entries.
+
+        An entry found only in the shared store is kept locally, so later
+        peeks reuse it along with its serialized bodies.
+        """
+        key = cache_key(preference, days)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.store is not None:
+            item = self.store.get("itinerary", key)
+            if item is not None:
+                entry = CachedItinerary(loads(item[0]), item[1])
+                self._put_local(key, entry)
+        if entry is not None and time.time() - entry.created_at > self.ttl:
+            return None
+        return entry
+
+    def set(self, preference: str, days: int, result: Dict[str, Any]) -> CachedItinerary:
+        key = cache_key(preference, days)
+        entry = CachedItinerary(result)
+        self._put_local(key, entry)
+        if self.store is not None:
+            self.store.set("itinerary", key, dumps(result), self.ttl, entry.created_at)
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        stats = {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+        if self.store is not None:
+            stats["shared_entries"] = self.store.count("itinerary")
+            stats["shared_hits"] = self.shared_hits
+        return stats
+
+
+# Create a global instance
+itinerary_cache = None
+
+def get_itinerary_cache() -> ItineraryCache:
+    """Get or create the itinerary cache instance."""
+    global itinerary_cache
+    if itinerary_cache is None:
+        store = get_shared_store()
+        itinerary_cache = ItineraryCache(store=store if store.shared else None)
+    return itinerary_cache
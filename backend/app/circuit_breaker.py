@@ -0,0 +1,170 @@
+"""
+Per-dependency circuit breakers (LLM, search).
+
+A breaker trips open when the error rate or slow-call rate over its recent
+calls crosses a threshold. While open, callers short-circuit immediately
+(the agent goes straight to the fallback itinerary). After a cooldown the
+breaker lets a few probe calls through in half-open state and closes again
+once they succeed.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+
+from .configs import (
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_ERROR_RATE,
+    BREAKER_SLOW_CALL_RATE,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_HALF_OPEN_CALLS,
+    LLM_BREAKER_SLOW_CALL_SECONDS,
+    SEARCH_BREAKER_SLOW_CALL_SECONDS,
+    REQUEST_DEADLINE,
+    DEADLINE_SEARCH_SHARE,
+    DEADLINE_PLANNING_SHARE,
+    DEADLINE_GENERATION_SHARE,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the breaker is open"""
+
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(f"Circuit breaker '{name}' is open")
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker driven by error rate and latency"""
+
+    def __init__(self, name: str, slow_call_seconds: float, window: int = BREAKER_WINDOW,
+                 min_calls: int = BREAKER_MIN_CALLS, error_rate: float = BREAKER_ERROR_RATE,
+                 slow_call_rate: float = BREAKER_SLOW_CALL_RATE, open_seconds: float = BREAKER_OPEN_SECONDS,
+                 half_open_calls: int = BREAKER_HALF_OPEN_CALLS):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate
+        self.slow_call_rate_threshold = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        # (failed, slow) per recent call
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.short_circuited = 0
+        self.trips = 0
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        """Return True if a call may proceed; half-open admits a limited number of probes"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.short_circuited += 1
+            return False
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.trips += 1
+
+    def _record(self, failed: bool, slow: bool):
+        with self._lock:
+            state = self._current_state()
+            if state == HALF_OPEN:
+                if failed or slow:
+                    self._trip()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            if state == OPEN:
+                return
+
+            self._outcomes.append((failed, slow))
+            if len(self._outcomes) < self.min_calls:
+                return
+            total = len(self._outcomes)
+            errors = sum(1 for f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, s in self._outcomes if s)
+            if errors / total >= self.error_rate_threshold or slow_calls / total >= self.slow_call_rate_threshold:
+                self._trip()
+                self._outcomes.clear()
+
+    def record_success(self, latency: float):
+        self._record(False, latency >= self.slow_call_seconds)
+
+    def record_failure(self):
+        self._record(True, False)
+
+    def record_timeout(self):
+        """A call the provider did not answer within its stage timeout: failed and slow"""
+        self._record(True, True)
+
+    def record_abandoned(self):
+        """Give back a half-open probe for a call abandoned before it had an outcome"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            total = len(self._outcomes)
+            return {
+                "state": state,
+                "recent_calls": total,
+                "error_rate": sum(1 for f, _ in self._outcomes if f) / total if total else 0.0,
+                "slow_call_rate": sum(1 for _, s in self._outcomes if s) / total if total else 0.0,
+                "trips": self.trips,
+                "short_circuited": self.short_circuited,
+                "retry_in": max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)) if state == OPEN else 0.0,
+            }
+
+
+def slow_call_threshold(configured: float, *stage_shares: float) -> float:
+    """Slow-call threshold kept below the shortest stage timeout of the dependency.
+
+    Calls running into the stage timeout are cut off and never complete, so a
+    threshold at or above it could never flag anything as slow.
+    """
+    return min(configured, 0.8 * REQUEST_DEADLINE * min(stage_shares))
+
+
+breakers = {
+    "llm": CircuitBreaker("llm", slow_call_threshold(
+        LLM_BREAKER_SLOW_CALL_SECONDS, DEADLINE_PLANNING_SHARE, DEADLINE_GENERATION_SHARE
+    )),
+    "search": CircuitBreaker("search", slow_call_threshold(SEARCH_BREAKER_SLOW_CALL_SECONDS, DEADLINE_SEARCH_SHARE)),
+}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get the circuit breaker for a dependency ("llm" or "search")."""
+    return breakers[name]
+
+def breaker_states() -> Dict[str, Any]:
+    """Snapshot of every breaker, for /health"""
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
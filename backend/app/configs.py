@@ -10,6 +10,9 @@ logger = logging.getLogger(__name__)
 # API Keys
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Optional second LLM provider (OpenAI or any OpenAI-compatible endpoint), used as "openai:<model>" backends
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
 
 # Validate API keys
 def validate_api_keys():
@@ -34,4 +37,139 @@ APP_CONFIG = {
     "description": "AI-powered travel itinerary generator for Sikkim",
     "version": "1.0.0",
     "debug": os.getenv("DEBUG", "False").lower() == "true"
-}
\ No newline at end of file
+}
+
+# LLM routing configuration
+# Ordered "provider:model" backends; the first is the primary, the rest are used for hedging and failover.
+# The default is two Groq models, so failover only covers model-level errors, not a Groq outage or
+# account-wide 429; add an "openai:<model>" backend for cross-provider failover.
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", "groq:llama3-70b-8192,groq:llama-3.3-70b-versatile")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8.0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Hedging to a backend of the same provider doubles usage against the same account quota; off by default
+LLM_HEDGE_SAME_PROVIDER = os.getenv("LLM_HEDGE_SAME_PROVIDER", "False").lower() == "true"
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "200"))
+
+# Model tiering configuration
+TIERING_ENABLED = os.getenv("TIERING_ENABLED", "True").lower() == "true"
+LLM_SMALL_BACKENDS = os.getenv("LLM_SMALL_BACKENDS", "groq:llama3-8b-8192")
+LLM_SMALL_TEMPERATURE = float(os.getenv("LLM_SMALL_TEMPERATURE", "0.5"))
+TIER_SMALL_MAX_DAYS = int(os.getenv("TIER_SMALL_MAX_DAYS", "3"))
+TIER_SMALL_MAX_INTERESTS = int(os.getenv("TIER_SMALL_MAX_INTERESTS", "2"))
+# Under load (queue depth at or above the threshold), requests up to this many days also use the small tier
+TIER_QUEUE_DEPTH_THRESHOLD = int(os.getenv("TIER_QUEUE_DEPTH_THRESHOLD", "8"))
+TIER_LOAD_SHED_MAX_DAYS = int(os.getenv("TIER_LOAD_SHED_MAX_DAYS", "7"))
+
+# Provider rate limits (requests/tokens per minute)
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "30000"))
+TAVILY_RPM = int(os.getenv("TAVILY_RPM", "100"))
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "200000"))
+# Longest time a request may wait for provider capacity before being rejected
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "5.0"))
+# Every provider call reserves one request plus its prompt tokens (estimated) and this many completion tokens
+LLM_CALL_COMPLETION_TOKENS = int(os.getenv("LLM_CALL_COMPLETION_TOKENS", "1500"))
+# Budget admitted per agent run before its first call: LLM calls, prompt tokens per call and completion tokens per day
+AGENT_RUN_LLM_CALLS = int(os.getenv("AGENT_RUN_LLM_CALLS", "3"))
+AGENT_RUN_PROMPT_TOKENS = int(os.getenv("AGENT_RUN_PROMPT_TOKENS", "2000"))
+AGENT_RUN_TOKENS_PER_DAY = int(os.getenv("AGENT_RUN_TOKENS_PER_DAY", "300"))
+
+# Per-client quotas (requests per minute), keyed by a known X-API-Key or else the client IP
+CLIENT_QUOTA_PER_MINUTE = int(os.getenv("CLIENT_QUOTA_PER_MINUTE", "10"))
+# Per-key overrides, e.g. "key1:60,key2:5"; these keys are honoured for quota keying
+CLIENT_QUOTA_OVERRIDES = os.getenv("CLIENT_QUOTA_OVERRIDES", "")
+# Further API keys honoured with the default quota, e.g. "key3,key4"; unknown keys are keyed by IP
+CLIENT_API_KEYS = os.getenv("CLIENT_API_KEYS", "")
+
+# Circuit breaker configuration
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "1"))
+# Calls slower than this count as slow; capped below the stage timeouts (80% of the shortest)
+LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "20"))
+SEARCH_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("SEARCH_BREAKER_SLOW_CALL_SECONDS", "10"))
+
+# Itinerary cache and response encoding
+ITINERARY_CACHE_TTL = int(os.getenv("ITINERARY_CACHE_TTL", "21600"))
+ITINERARY_CACHE_MAX_ENTRIES = int(os.getenv("ITINERARY_CACHE_MAX_ENTRIES", "512"))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Multi-worker deployment
+WORKERS = max(1, int(os.getenv("WORKERS", "1")))
+# SQLite (WAL) file shared by all workers for itinerary and search caches; empty keeps caches in-process
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+# Seconds between sweeps deleting expired rows from the shared cache file
+SHARED_CACHE_PURGE_INTERVAL = int(os.getenv("SHARED_CACHE_PURGE_INTERVAL", "600"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "86400"))
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "True").lower() == "true"
+
+# Itinerary refinement sessions
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+
+# Accommodation catalog and URL validation
+ACCOMMODATION_CATALOG_PATH = os.getenv(
+    "ACCOMMODATION_CATALOG_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "accommodations.json")
+)
+URL_CHECK_TTL = int(os.getenv("URL_CHECK_TTL", "86400"))
+URL_CHECK_TIMEOUT = float(os.getenv("URL_CHECK_TIMEOUT", "3.0"))
+
+# Cache pre-warming
+REQUEST_STATS_TTL = int(os.getenv("REQUEST_STATS_TTL", str(7 * 86400)))
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "20"))
+# Configured "preference:days" list, used when there are no request stats yet
+PREWARM_COMBINATIONS = os.getenv("PREWARM_COMBINATIONS", "")
+# Entries expiring within this many seconds are regenerated
+PREWARM_REFRESH_MARGIN = int(os.getenv("PREWARM_REFRESH_MARGIN", "1800"))
+# Local hours [start, end) during which the background job may run
+PREWARM_OFF_PEAK_HOURS = os.getenv("PREWARM_OFF_PEAK_HOURS", "1-6")
+# Seconds between background runs inside the app; 0 disables (use the CLI instead)
+PREWARM_INTERVAL = int(os.getenv("PREWARM_INTERVAL", "0"))
+# Share of each provider budget reserved for a separate `python -m app.prewarm` process; the server
+# workers split the rest. Leave at 0 when pre-warming only runs inside the server (PREWARM_INTERVAL)
+PREWARM_BUDGET_SHARE = float(os.getenv("PREWARM_BUDGET_SHARE", "0"))
+
+# Request deadlines
+# End-to-end time budget for one itinerary request, in seconds
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "90"))
+# Longest share of the budget a single search / agent planning call / itinerary generation call may take
+DEADLINE_SEARCH_SHARE = float(os.getenv("DEADLINE_SEARCH_SHARE", "0.15"))
+DEADLINE_PLANNING_SHARE = float(os.getenv("DEADLINE_PLANNING_SHARE", "0.3"))
+DEADLINE_GENERATION_SHARE = float(os.getenv("DEADLINE_GENERATION_SHARE", "0.5"))
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", "6"))
+# How often to check for client disconnects and cancellations while a request is running
+CANCEL_POLL_INTERVAL = float(os.getenv("CANCEL_POLL_INTERVAL", "0.5"))
+
+# Approximate (semantic) itinerary cache
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+# Cosine similarity at or above which a cached itinerary for a similar preference is served as-is
+SEMANTIC_SERVE_THRESHOLD = float(os.getenv("SEMANTIC_SERVE_THRESHOLD", "0.85"))
+# Similarity at or above which a similar cached itinerary seeds generation (set above 1 to disable)
+SEMANTIC_SEED_THRESHOLD = float(os.getenv("SEMANTIC_SEED_THRESHOLD", "0.5"))
+# Fraction of approximate hits regenerated in the background to measure the false-hit rate
+SEMANTIC_AUDIT_RATE = float(os.getenv("SEMANTIC_AUDIT_RATE", "0.05"))
+# Served and regenerated itineraries less similar than this count as a false hit
+SEMANTIC_AUDIT_MIN_AGREEMENT = float(os.getenv("SEMANTIC_AUDIT_MIN_AGREEMENT", "0.3"))
+# How often each worker picks up entries other workers wrote to the shared store
+SEMANTIC_SYNC_INTERVAL = float(os.getenv("SEMANTIC_SYNC_INTERVAL", "60"))
+
+# On-demand request profiling (off unless enabled)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() == "true"
+# Requests sending "X-Profile: <token>" are profiled; empty disables the header trigger
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+# Fraction of agent runs profiled without the header
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.0"))
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.005"))
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "120"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "profiles"))
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "50"))
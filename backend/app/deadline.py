@@ -0,0 +1,108 @@
+"""
+End-to-end request deadlines and cancellation.
+
+A Deadline is created per request and made current for the worker thread
+running the agent. Provider calls (search, LLM) read it to bound their own
+waits: each call gets at most its stage's share of the total budget and never
+more than what is left. Cancelling the deadline (e.g. when the client
+disconnects) makes the next check raise RequestCancelled, so in-flight calls
+stop being waited on and no further calls are started.
+"""
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from .configs import (
+    REQUEST_DEADLINE,
+    CANCEL_POLL_INTERVAL,
+    DEADLINE_SEARCH_SHARE,
+    DEADLINE_PLANNING_SHARE,
+    DEADLINE_GENERATION_SHARE,
+)
+
+# Stages of an agent run and the share of the total budget one call may use
+SEARCH = "search"
+PLANNING = "planning"
+GENERATION = "generation"
+
+STAGE_SHARES = {
+    SEARCH: DEADLINE_SEARCH_SHARE,
+    PLANNING: DEADLINE_PLANNING_SHARE,
+    GENERATION: DEADLINE_GENERATION_SHARE,
+}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's time budget is spent"""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        super().__init__(f"Request deadline exceeded during {stage}")
+
+
+class RequestCancelled(Exception):
+    """Raised when the request was cancelled, e.g. because the client disconnected"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(f"Request cancelled: {reason}")
+
+
+class Deadline:
+    """Time budget and cancellation flag shared by all stages of one request"""
+
+    def __init__(self, budget: float = REQUEST_DEADLINE):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self.reason: Optional[str] = None
+        # Best itinerary JSON produced so far, used if the run is cut short
+        self.partial_output: Optional[str] = None
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str):
+        self.reason = reason
+        self._cancelled.set()
+
+    def check(self, stage: str):
+        """Raise if the request was cancelled or its budget is spent"""
+        if self._cancelled.is_set():
+            raise RequestCancelled(self.reason)
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(stage)
+
+    def stage_timeout(self, stage: str) -> float:
+        """Time a single call of the given stage may take"""
+        self.check(stage)
+        return min(self.remaining(), self.budget * STAGE_SHARES.get(stage, 1.0))
+
+
+# Deadline of the request being served by the current thread/context
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def wait_for(future: Future, deadline: Deadline, stage: str) -> Any:
+    """Wait for a future within the stage timeout, polling for cancellation.
+
+    The future is cancelled (or its result discarded, if already running)
+    when the wait is abandoned.
+    """
+    expires_at = time.monotonic() + deadline.stage_timeout(stage)
+    while True:
+        try:
+            return future.result(timeout=max(0.0, min(expires_at - time.monotonic(), CANCEL_POLL_INTERVAL)))
+        except FutureTimeout:
+            if deadline.cancelled:
+                future.cancel()
+                raise RequestCancelled(deadline.reason)
+            if time.monotonic() >= expires_at:
+                future.cancel()
+                raise DeadlineExceeded(stage)
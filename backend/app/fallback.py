@@ -4,41 +4,41 @@ Fallback itinerary generator for when the agent fails
 import json
 from typing import List, Dict, Any
 
+# Base activities for different preferences
+preference_activities = {
+    "culture": [
+        "Visit Rumtek Monastery - Buddhist architecture and culture",
+        "Explore MG Marg - Local markets and street food",
+        "Tour Enchey Monastery - Traditional Sikkimese culture",
+        "Visit Namgyal Institute of Tibetology - Tibetan artifacts",
+        "Experience local tea ceremony"
+    ],
+    "adventure": [
+        "Trek to Dzongri - Mountain hiking",
+        "River rafting on Teesta River",
+        "Paragliding at Gangtok",
+        "Mountain biking in Pelling",
+        "Rock climbing at various locations"
+    ],
+    "nature": [
+        "Visit Tsomgo Lake - High altitude lake",
+        "Explore Yumthang Valley - Flower valley",
+        "Trek to Kanchenjunga Base Camp",
+        "Visit Gurudongmar Lake",
+        "Explore Rhododendron Sanctuary"
+    ],
+    "spiritual": [
+        "Meditation at Rumtek Monastery",
+        "Visit Pemayangtse Monastery",
+        "Attend prayer ceremonies",
+        "Visit Tashiding Monastery",
+        "Experience spiritual retreat"
+    ]
+}
+
 def get_fallback_itinerary(preference: str, days: int) -> List[Dict[str, Any]]:
     """Generate a fallback itinerary when the agent fails"""
     
-    # Base activities for different preferences
-    preference_activities = {
-        "culture": [
-            "Visit Rumtek Monastery - Buddhist architecture and culture",
-            "Explore MG Marg - Local markets and street food",
-            "Tour Enchey Monastery - Traditional Sikkimese culture",
-            "Visit Namgyal Institute of Tibetology - Tibetan artifacts",
-            "Experience local tea ceremony"
-        ],
-        "adventure": [
-            "Trek to Dzongri - Mountain hiking",
-            "River rafting on Teesta River",
-            "Paragliding at Gangtok",
-            "Mountain biking in Pelling",
-            "Rock climbing at various locations"
-        ],
-        "nature": [
-            "Visit Tsomgo Lake - High altitude lake",
-            "Explore Yumthang Valley - Flower valley",
-            "Trek to Kanchenjunga Base Camp",
-            "Visit Gurudongmar Lake",
-            "Explore Rhododendron Sanctuary"
-        ],
-        "spiritual": [
-            "Meditation at Rumtek Monastery",
-            "Visit Pemayangtse Monastery",
-            "Attend prayer ceremonies",
-            "Visit Tashiding Monastery",
-            "Experience spiritual retreat"
-        ]
-    }
-    
     # Default to culture if preference not found
     activities = preference_activities.get(preference.lower(), preference_activities["culture"])
     
@@ -1,5 +1,35 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 import json
+from pydantic import TypeAdapter
+from .models import FinishedDayPlan
+
+# Compiled once; validates raw JSON bytes straight into finished day dicts
+ITINERARY_ADAPTER = TypeAdapter(List[FinishedDayPlan])
+
+def parse_itinerary(raw: Union[str, bytes, List[Dict[str, Any]]], days: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Validate and normalize an itinerary (raw JSON or parsed list) in one compiled stage.
+    
+    pydantic-core validates each day and finishes it in the same pass
+    (models.finish_day reconciles accommodation/accommodations, wraps a
+    lone activity string and adds activity_count). With days given, the
+    itinerary must cover exactly that many days. Raises
+    pydantic.ValidationError (or ValueError for a wrong day count) on
+    invalid input.
+    """
+    if isinstance(raw, (str, bytes, bytearray)):
+        itinerary = ITINERARY_ADAPTER.validate_json(raw)
+    else:
+        itinerary = ITINERARY_ADAPTER.validate_python(raw)
+    if days is not None and len(itinerary) != days:
+        raise ValueError(f"expected {days} days, got {len(itinerary)}")
+    return itinerary
+
+def summarize_itinerary(itinerary: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Derived totals for a normalized itinerary"""
+    return {
+        "total_activities": sum(day["activity_count"] for day in itinerary),
+        "locations": list(dict.fromkeys(day["location"] for day in itinerary if day["location"]))
+    }
 
 def get_sample_itinerary(preference: str, days: int) -> List[Dict[str, Any]]:
     """Generate a sample itinerary when external APIs fail"""
@@ -0,0 +1,381 @@
+"""
+LLM routing layer with hedged requests and multi-provider failover.
+
+Backends are tried in order. If the active backend has not answered by its
+latency-percentile deadline, a hedge request is sent to the next backend and
+the first valid result wins. Errors fail over to the next backend immediately.
+
+Hedging only goes to a backend of a different provider unless
+LLM_HEDGE_SAME_PROVIDER is set: a duplicate request to the same provider
+spends the same account quota and does not help when that provider is slow.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, AIMessage
+from langchain_core.outputs import ChatResult, ChatGeneration
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_groq import ChatGroq
+
+try:
+    from langchain_openai import ChatOpenAI
+except ImportError:  # pragma: no cover - optional provider
+    ChatOpenAI = None
+
+from .configs import (
+    GROQ_API_KEY,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    LLM_BACKENDS,
+    LLM_TEMPERATURE,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_DEFAULT_DELAY,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_SAME_PROVIDER,
+    LLM_STATS_WINDOW,
+    LLM_SMALL_BACKENDS,
+    LLM_SMALL_TEMPERATURE,
+    CANCEL_POLL_INTERVAL,
+    RATE_LIMIT_MAX_WAIT,
+)
+from .circuit_breaker import get_breaker, CircuitOpenError
+from .rate_limit import get_rate_limiter, estimate_call_tokens, RateLimitExceeded
+from .deadline import current_deadline, DeadlineExceeded, RequestCancelled, GENERATION, PLANNING
+from .profiling import in_context
+
+logger = logging.getLogger(__name__)
+
+
+class LLMRouterError(Exception):
+    """Raised when every configured backend failed to produce a valid result"""
+
+
+# Model tier used by router calls in the current request context
+current_tier: ContextVar[Optional[str]] = ContextVar("llm_tier", default=None)
+
+
+def _build_groq(model_name: str, temperature: float):
+    if not GROQ_API_KEY:
+        raise ValueError("GROQ API key not configured")
+    return ChatGroq(model_name=model_name, api_key=GROQ_API_KEY, temperature=temperature)
+
+
+def _build_openai(model_name: str, temperature: float):
+    if not OPENAI_API_KEY:
+        raise ValueError("OpenAI API key not configured")
+    return ChatOpenAI(model=model_name, api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None,
+                      temperature=temperature)
+
+
+# Provider name -> factory(model_name, temperature)
+PROVIDERS: Dict[str, Callable[[str, float], Any]] = {
+    "groq": _build_groq,
+}
+if ChatOpenAI is not None:
+    PROVIDERS["openai"] = _build_openai
+
+
+def parse_backends(spec: str) -> List[Tuple[str, str]]:
+    """Parse a "provider:model,provider:model" spec into (provider, model) pairs"""
+    backends = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        provider, sep, model_name = entry.partition(":")
+        if not sep:
+            provider, model_name = "groq", entry
+        provider = provider.strip().lower()
+        if provider not in PROVIDERS:
+            logger.warning(f"Unknown LLM provider '{provider}' in LLM_BACKENDS, skipping")
+            continue
+        backends.append((provider, model_name.strip()))
+    return backends
+
+
+class LatencyStats:
+    """Rolling latency window and outcome counters for one backend"""
+
+    def __init__(self, window: int = LLM_STATS_WINDOW):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.errors = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+            self.successes += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def sample_count(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the pct-th latency percentile (nearest-rank), or None without samples"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        rank = max(0, min(len(samples) - 1, int(round(pct / 100.0 * len(samples))) - 1))
+        return samples[rank]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "samples": self.sample_count(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "successes": self.successes,
+            "errors": self.errors,
+            "hedges": self.hedges,
+            "wins": self.wins,
+        }
+
+
+class LLMBackend:
+    """A single provider/model pair with its own latency stats"""
+
+    def __init__(self, provider: str, model_name: str, temperature: float = LLM_TEMPERATURE):
+        self.provider = provider
+        self.model_name = model_name
+        self.temperature = temperature
+        self.stats = LatencyStats()
+        self._model = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model_name}"
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = PROVIDERS[self.provider](self.model_name, self.temperature)
+        return self._model
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for this backend before hedging to the next one"""
+        if self.stats.sample_count() < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, self.stats.percentile(LLM_HEDGE_PERCENTILE))
+
+    def invoke(self, messages, **kwargs):
+        start = time.monotonic()
+        try:
+            result = self.model.invoke(messages, **kwargs)
+        except Exception:
+            self.stats.record_error()
+            raise
+        self.stats.record_success(time.monotonic() - start)
+        return result
+
+
+class LLMRouter:
+    """Routes LLM calls across ordered backends with hedging and failover.
+
+    Backends are grouped into named tiers; the first tier is the default.
+    """
+
+    def __init__(self, tiers: Dict[str, List[LLMBackend]], max_workers: int = 16):
+        tiers = {name: backends for name, backends in tiers.items() if backends}
+        if not tiers:
+            raise ValueError("No LLM backends configured")
+        self.tiers = tiers
+        self.default_tier = next(iter(tiers))
+        self.backends = [b for backends in tiers.values() for b in backends]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+
+    def backends_for(self, tier: Optional[str] = None) -> List[LLMBackend]:
+        """Return the backends of a tier, falling back to the default tier"""
+        tier = tier or current_tier.get() or self.default_tier
+        return self.tiers.get(tier, self.tiers[self.default_tier])
+
+    def invoke(self, messages, validate: Optional[Callable[[Any], bool]] = None,
+               backends: Optional[List[LLMBackend]] = None, stage: str = GENERATION, **kwargs):
+        """Invoke the backends and return the first valid result.
+
+        Without explicit backends, the tier set in current_tier is used.
+        Raises CircuitOpenError without calling any backend while the LLM
+        circuit breaker is open. Under a request deadline the call is bounded
+        by the stage's timeout and raises DeadlineExceeded/RequestCancelled
+        when it runs out or the request is cancelled.
+        """
+        deadline = current_deadline.get()
+        timeout = deadline.stage_timeout(stage) if deadline is not None else None
+
+        breaker = get_breaker("llm")
+        if not breaker.allow_request():
+            raise CircuitOpenError("llm")
+
+        start = time.monotonic()
+        try:
+            result = self._invoke_backends(messages, validate, backends, timeout, stage, **kwargs)
+        except DeadlineExceeded:
+            # The provider did not answer within the stage timeout
+            breaker.record_timeout()
+            raise
+        except (RequestCancelled, RateLimitExceeded):
+            # The client went away or we had no provider budget; no outcome from the provider
+            breaker.record_abandoned()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success(time.monotonic() - start)
+        return result
+
+    def _invoke_backends(self, messages, validate, backends, timeout: Optional[float] = None,
+                         stage: str = GENERATION, **kwargs):
+        """Hedged/failover invocation across the backends.
+
+        A hedge is launched when the newest in-flight request passes its
+        backend's hedge deadline (to a different provider, unless
+        LLM_HEDGE_SAME_PROVIDER is set); an error or invalid result launches the next
+        backend immediately. Losing requests are cancelled if not yet started,
+        otherwise their results are discarded. With a timeout, provider
+        requests are sent with it and the wait is abandoned (pending requests
+        cancelled) once it passes or the request deadline is cancelled.
+
+        Every launch reserves provider rate-limit budget first, drawing on
+        the agent run's admitted budget where there is one. Hedges only
+        go out if budget is available immediately; the primary and failover
+        requests wait for it and raise RateLimitExceeded if it doesn't come.
+        """
+        queue = list(backends or self.backends_for())
+        pending: Dict[Any, LLMBackend] = {}
+        errors: List[str] = []
+        deadline = current_deadline.get() if timeout is not None else None
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        if timeout is not None:
+            # Bound the provider HTTP request itself, not just our wait for it
+            kwargs["timeout"] = timeout
+
+        limiter = get_rate_limiter()
+        tokens = estimate_call_tokens(messages)
+
+        def launch(hedge: bool = False):
+            backend = queue[0]
+            max_wait = RATE_LIMIT_MAX_WAIT
+            if hedge:
+                max_wait = 0.0
+            elif expires_at is not None:
+                max_wait = min(max_wait, max(0.0, expires_at - time.monotonic()))
+            # Hedges are extra calls: they never eat into the run's admitted budget
+            limiter.reserve_llm_call(backend.provider, tokens, max_wait=max_wait, use_run_budget=not hedge)
+            queue.pop(0)
+            future = self._executor.submit(in_context(backend.invoke), messages, **kwargs)
+            pending[future] = backend
+            return backend, time.monotonic() + backend.hedge_delay()
+
+        def abandon():
+            for future in pending:
+                future.cancel()
+
+        def can_hedge():
+            return (bool(queue) and hedge_at is not None
+                    and (LLM_HEDGE_SAME_PROVIDER or queue[0].provider != current.provider))
+
+        current, hedge_at = launch()
+        while pending:
+            now = time.monotonic()
+            waits = [hedge_at - now] if can_hedge() else []
+            if expires_at is not None:
+                if deadline is not None and deadline.cancelled:
+                    abandon()
+                    raise RequestCancelled(deadline.reason)
+                if now >= expires_at:
+                    abandon()
+                    raise DeadlineExceeded(stage)
+                waits += [expires_at - now, CANCEL_POLL_INTERVAL]
+            done, _ = wait(list(pending), timeout=max(0.0, min(waits)) if waits else None,
+                           return_when=FIRST_COMPLETED)
+
+            if not done:
+                if can_hedge() and time.monotonic() >= hedge_at:
+                    try:
+                        hedged, hedged_at = launch(hedge=True)
+                    except RateLimitExceeded:
+                        # No spare provider budget for a duplicate request; keep waiting on the current one
+                        hedge_at = None
+                        continue
+                    logger.info(f"Hedging LLM request: {current.name} exceeded {current.hedge_delay():.2f}s, "
+                                f"trying {hedged.name}")
+                    current.stats.hedges += 1
+                    current, hedge_at = hedged, hedged_at
+                continue
+
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    result = future.result()
+                    if validate is not None and not validate(result):
+                        raise ValueError("result failed validation")
+                except Exception as e:
+                    logger.warning(f"LLM backend {backend.name} failed: {str(e)}")
+                    errors.append(f"{backend.name}: {str(e)}")
+                    continue
+
+                backend.stats.wins += 1
+                abandon()
+                return result
+
+            if not pending and queue:
+                current, hedge_at = launch()
+
+        raise LLMRouterError(f"All LLM backends failed: {'; '.join(errors)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {backend.name: backend.stats.snapshot() for backend in self.backends}
+
+
+class RoutedChatModel(BaseChatModel):
+    """LangChain chat model that delegates every call to an LLMRouter.
+
+    Lets the tool-calling agent use hedging and failover transparently.
+    """
+
+    router: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        formatted_tools = [convert_to_openai_tool(t) for t in tools]
+        return self.bind(tools=formatted_tools, **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        message = self.router.invoke(
+            messages,
+            validate=lambda m: isinstance(m, AIMessage),
+            stage=PLANNING,
+            stop=stop,
+            **kwargs
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+# Create a global instance
+llm_router = None
+
+def get_llm_router() -> LLMRouter:
+    """Get or create the LLM router instance."""
+    global llm_router
+    if llm_router is None:
+        llm_router = LLMRouter({
+            "large": [LLMBackend(p, m) for p, m in parse_backends(LLM_BACKENDS)],
+            "small": [LLMBackend(p, m, LLM_SMALL_TEMPERATURE) for p, m in parse_backends(LLM_SMALL_BACKENDS)],
+        })
+    return llm_router
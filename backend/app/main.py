@@ -1,15 +1,36 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Depends, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import requests
 import os
 from fastapi.middleware.cors import CORSMiddleware
-from .models import ItineraryRequest, TravelState
-from .agent import get_travel_agent
-from .configs import GROQ_API_KEY, TAVILY_API_KEY
+from .models import ItineraryRequest, ItineraryEditRequest, TravelState
+from .agent import get_travel_agent, InvalidPatchError
+from .llm_router import get_llm_router, LLMRouterError
+from .tiering import get_tiering_policy
+from .rate_limit import get_rate_limiter, get_client_quotas, RateLimitExceeded
+from .circuit_breaker import breaker_states, CircuitOpenError
+from .cache import get_itinerary_cache, CachedItinerary, normalize_preference
+from .shared_store import get_shared_store, start_background_purge
+from .sessions import get_session_store, parse_target_days
+from .accommodations import build_hotels_by_location
+from .responses import json_response
+from .deadline import Deadline, DeadlineExceeded, RequestCancelled
+from .semantic_cache import get_semantic_cache, SERVE
+from .profiling import get_profiler
+from . import prewarm
+from .configs import (
+    GROQ_API_KEY, TAVILY_API_KEY, WARMUP_ON_STARTUP, PREWARM_INTERVAL, WORKERS, CANCEL_POLL_INTERVAL,
+    SEMANTIC_CACHE_ENABLED, PROFILING_TOKEN,
+)
     # LangGraph removed. Only LangChain agent is used.
+import asyncio
 import json
 import logging
+import secrets
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -35,13 +56,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def warm_up():
+    """Pre-warm this worker: open the cache store and build the agent and LLM clients"""
+    get_shared_store()
+    get_itinerary_cache()
+    start_background_purge()
+    # With several workers, run `python -m app.prewarm` separately instead of once per worker
+    if PREWARM_INTERVAL > 0 and WORKERS == 1:
+        prewarm.start_background_prewarm(PREWARM_INTERVAL)
+    if not WARMUP_ON_STARTUP:
+        return
+    try:
+        get_travel_agent()
+        for backend in get_llm_router().backends:
+            backend.model
+        logger.info(f"Worker {os.getpid()} warmed up")
+    except Exception as e:
+        logger.warning(f"Warm-up skipped: {str(e)}")
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    retry_after = max(1, int(exc.retry_after + 0.999))
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "error": "Rate limit exceeded", "detail": str(exc)},
+        headers={"Retry-After": str(retry_after)}
+    )
+
+@app.exception_handler(RequestCancelled)
+async def request_cancelled_handler(request: Request, exc: RequestCancelled):
+    # Nobody is listening any more; 499 is the conventional "client closed request" status
+    return JSONResponse(status_code=499, content={"success": False, "error": str(exc)})
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"success": False, "error": str(exc)})
+
+def require_profiling_token(x_profile: Optional[str] = Header(None)):
+    """Stored profiles are only listed/served with the profiling token; without one configured, never"""
+    if not PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Profile endpoints are disabled (PROFILING_TOKEN not set)")
+    if not (x_profile and secrets.compare_digest(x_profile, PROFILING_TOKEN)):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+
+def enforce_client_quota(request: Request, x_api_key: Optional[str] = Header(None)):
+    """Per-client quota keyed by X-API-Key when it is a configured key, otherwise by client IP"""
+    quotas = get_client_quotas()
+    client_ip = request.client.host if request.client else "anonymous"
+    quotas.check(quotas.client_key(x_api_key, client_ip))
+
 @app.get("/")
 def read_root():
     return {"message": "Sikkim Travel Itinerary API v2.0", "status": "running", "framework": "LangChain Agent"}
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "api_keys_configured": bool(GROQ_API_KEY and TAVILY_API_KEY)}
+    states = breaker_states()
+    return {
+        "status": "healthy" if all(b["state"] == "closed" for b in states.values()) else "degraded",
+        "api_keys_configured": bool(GROQ_API_KEY and TAVILY_API_KEY),
+        "circuit_breakers": states
+    }
 
 @app.get("/debug/api-keys")
 def debug_api_keys():
@@ -53,7 +129,7 @@ def debug_api_keys():
         "tavily_key_length": len(TAVILY_API_KEY) if TAVILY_API_KEY else 0
     }
 
-@app.post("/test-ai")
+@app.post("/test-ai", dependencies=[Depends(enforce_client_quota)])
 async def test_ai():
     """Test endpoint to directly test GROQ AI"""
     try:
@@ -75,8 +151,78 @@ async def test_ai():
         logger.error(f"AI test failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI test failed: {str(e)}")
 
-@app.post("/generate-itinerary")
-async def generate_itinerary(req: ItineraryRequest):
+async def _run_until_disconnect(request: Request, func, *args, **kwargs):
+    """Run a blocking agent call in the threadpool under a fresh request deadline.
+
+    The client connection is polled while the call runs; if it goes away,
+    the deadline is cancelled so the agent stops at its next provider call
+    and RequestCancelled is raised. The call is profiled when profiling is
+    enabled and the request asks for it (or is sampled).
+    """
+    profiler = get_profiler()
+    profile = None
+    if profiler is not None:
+        trigger = profiler.should_profile(request.headers.get("x-profile"))
+        if trigger:
+            profile = profiler.start(request.url.path, trigger)
+            func = profile.wrap(func)
+
+    deadline = Deadline()
+    task = asyncio.ensure_future(run_in_threadpool(func, *args, deadline=deadline, **kwargs))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=CANCEL_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected from {request.url.path}, cancelling")
+                deadline.cancel("client disconnected")
+                return await task
+    finally:
+        if profile is not None:
+            await run_in_threadpool(profiler.finish, profile)
+
+async def _get_itinerary(request: Request, preference: str, days: int) -> Tuple[CachedItinerary, Optional[str]]:
+    """Return the cached agent result for a request, generating it on a miss.
+
+    On an exact-key miss, a cached itinerary for a similar preference and
+    the same days is served if it is close enough, or used to seed the
+    generation. Only genuine agent results are cached; fallback, partial
+    and failed results are wrapped but not stored. The second value is the
+    cached preference that was served for an approximate hit, else None.
+    """
+    cache = get_itinerary_cache()
+    # Stats and cache go through the shared store, which may be SQLite; keep them off the event loop
+    await run_in_threadpool(prewarm.record_request, preference, days)
+    entry = await run_in_threadpool(cache.get, preference, days)
+    if entry is not None:
+        return entry, None
+
+    seed = None
+    if SEMANTIC_CACHE_ENABLED:
+        semantic = get_semantic_cache()
+        # The lookup may first sync keys from the shared store
+        match = await run_in_threadpool(semantic.lookup, preference, days)
+        similar = await run_in_threadpool(cache.peek, match.preference, days) if match is not None else None
+        if match is not None and similar is None:
+            semantic.discard(match.preference, days)
+        elif match is not None and match.action == SERVE:
+            logger.info(f"Serving cached itinerary for '{match.preference}' (similarity {match.score:.2f})")
+            semantic.maybe_audit(preference, days, match, similar.result)
+            return similar, match.preference
+        elif match is not None:
+            seed = {"preference": match.preference, "itinerary": similar.result["itinerary"]}
+
+    travel_agent = get_travel_agent()
+    result = await _run_until_disconnect(request, travel_agent.generate_itinerary, preference, days, seed=seed)
+    if result.get("success") and "note" not in result:
+        if SEMANTIC_CACHE_ENABLED:
+            get_semantic_cache().add(preference, days)
+        return await run_in_threadpool(cache.set, preference, days, result), None
+    return CachedItinerary(result), None
+
+@app.post("/generate-itinerary", dependencies=[Depends(enforce_client_quota)])
+async def generate_itinerary(req: ItineraryRequest, request: Request):
     try:
         # Validate API keys
         if not GROQ_API_KEY:
@@ -93,19 +239,31 @@ async def generate_itinerary(req: ItineraryRequest):
         
         logger.info(f"Generating itinerary for {req.days} days with preference: {req.preference}")
         
-        # Get the travel agent and generate itinerary
+        # Get the travel agent and generate itinerary (or serve it from cache)
         try:
-            travel_agent = get_travel_agent()
-            result = travel_agent.generate_itinerary(req.preference, req.days)
+            entry, matched_preference = await _get_itinerary(request, req.preference, req.days)
+            result = entry.result
             
             if result.get("success"):
-                return {
-                    "success": True,
-                    "itinerary": result["itinerary"],
-                    "preference": req.preference,
-                    "days": req.days,
-                    "framework": "LangChain Agent"
-                }
+                # Bodies are keyed (and echo the preference) normalized, like the cache itself
+                preference = normalize_preference(req.preference)
+
+                def build_payload(r):
+                    payload = {
+                        "success": True,
+                        "itinerary": r["itinerary"],
+                        "total_activities": r.get("total_activities"),
+                        "locations": r.get("locations"),
+                        "preference": preference,
+                        "days": req.days,
+                        "framework": "LangChain Agent"
+                    }
+                    if matched_preference:
+                        # Served from the cached itinerary of a similar preference
+                        payload["matched_preference"] = matched_preference
+                    return payload
+                serialized = entry.serialized(f"itinerary:{preference}", build_payload)
+                return json_response(request, serialized)
             else:
                 # If agent failed, provide detailed error
                 error_msg = result.get("error", "Unknown error occurred")
@@ -117,7 +275,7 @@ async def generate_itinerary(req: ItineraryRequest):
             logger.error(f"Configuration error: {str(ve)}")
             raise HTTPException(status_code=500, detail=f"Configuration error: {str(ve)}")
             
-    except HTTPException:
+    except (HTTPException, RateLimitExceeded, RequestCancelled):
         raise
     except Exception as e:
         logger.error(f"Error generating itinerary: {str(e)}")
@@ -129,7 +287,7 @@ async def generate_itinerary(req: ItineraryRequest):
         else:
             raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.post("/test-agent")
+@app.post("/test-agent", dependencies=[Depends(enforce_client_quota)])
 async def test_agent():
     """Test endpoint to verify the agent is working"""
     try:
@@ -137,21 +295,23 @@ async def test_agent():
             raise HTTPException(status_code=500, detail="API keys not configured")
         
         travel_agent = get_travel_agent()
-        result = travel_agent.generate_itinerary("culture", 2)
+        result = await run_in_threadpool(travel_agent.generate_itinerary, "culture", 2)
         
         return {
             "success": True,
             "agent_test": result,
             "message": "Agent is working correctly"
         }
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         logger.error(f"Agent test failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Agent test failed: {str(e)}")
 
 
 # New endpoint: generate itinerary and hotels using LangChain agent only
-@app.post("/generate-full-itinerary")
-async def generate_full_itinerary(req: ItineraryRequest):
+@app.post("/generate-full-itinerary", dependencies=[Depends(enforce_client_quota)])
+async def generate_full_itinerary(req: ItineraryRequest, request: Request):
     try:
         if not GROQ_API_KEY:
             raise HTTPException(status_code=500, detail="GROQ API key not configured")
@@ -162,29 +322,181 @@ async def generate_full_itinerary(req: ItineraryRequest):
         if not req.preference or len(req.preference.strip()) == 0:
             raise HTTPException(status_code=400, detail="Preference cannot be empty")
 
-        travel_agent = get_travel_agent()
-        result = travel_agent.generate_itinerary(req.preference, req.days)
+        entry, matched_preference = await _get_itinerary(request, req.preference, req.days)
+        result = entry.result
         if result.get("success"):
-            # Extract hotels/homestays from itinerary if present
-            hotels_by_location = {}
-            for day in result["itinerary"]:
-                loc = day.get("location", "Unknown")
-                accs = day.get("accommodations", [])
-                hotels_by_location[loc] = accs
-            return {
-                "success": True,
-                "itinerary": result["itinerary"],
-                "hotels": hotels_by_location,
-                "preference": req.preference,
-                "days": req.days,
-                "framework": "LangChain Agent"
-            }
+            preference = normalize_preference(req.preference)
+
+            def build_payload(r):
+                # Catalog + LLM hotels/homestays aggregated per location across all days
+                payload = {
+                    "success": True,
+                    "itinerary": r["itinerary"],
+                    "hotels": build_hotels_by_location(r["itinerary"]),
+                    "total_activities": r.get("total_activities"),
+                    "locations": r.get("locations"),
+                    "preference": preference,
+                    "days": req.days,
+                    "framework": "LangChain Agent"
+                }
+                if matched_preference:
+                    payload["matched_preference"] = matched_preference
+                return payload
+            variant = f"full:{preference}"
+            # Building the payload may check URLs over the network, so do it off the event loop
+            serialized = entry.peek(variant) or await run_in_threadpool(entry.serialized, variant, build_payload)
+            return json_response(request, serialized)
         else:
             error_msg = result.get("error", "Unknown error occurred")
             logger.error(f"Agent failed: {error_msg}")
             raise HTTPException(status_code=500, detail=f"Agent failed: {error_msg}")
-    except HTTPException:
+    except (HTTPException, RateLimitExceeded, RequestCancelled):
         raise
     except Exception as e:
         logger.error(f"Error generating itinerary: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.post("/sessions", dependencies=[Depends(enforce_client_quota)])
+async def create_session(req: ItineraryRequest, request: Request):
+    """Generate an itinerary and keep it server-side for incremental edits"""
+    try:
+        if not GROQ_API_KEY:
+            raise HTTPException(status_code=500, detail="GROQ API key not configured")
+        if not TAVILY_API_KEY:
+            raise HTTPException(status_code=500, detail="Tavily API key not configured")
+
+        entry, matched_preference = await _get_itinerary(request, req.preference, req.days)
+        result = entry.result
+        if not result.get("success"):
+            error_msg = result.get("error", "Unknown error occurred")
+            logger.error(f"Agent failed: {error_msg}")
+            raise HTTPException(status_code=500, detail=f"Agent failed: {error_msg}")
+
+        session = await run_in_threadpool(get_session_store().create, req.preference, req.days, result["itinerary"])
+        if matched_preference:
+            return {**session, "matched_preference": matched_preference}
+        return session
+    except (HTTPException, RateLimitExceeded, RequestCancelled):
+        raise
+    except Exception as e:
+        logger.error(f"Error creating session: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/sessions/{session_id}")
+def get_session(session_id: str):
+    session = get_session_store().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+@app.post("/sessions/{session_id}/edit", dependencies=[Depends(enforce_client_quota)])
+async def edit_session(session_id: str, req: ItineraryEditRequest, request: Request):
+    """Regenerate only the days targeted by an edit instruction and merge them into the session"""
+    store = get_session_store()
+    session = await run_in_threadpool(store.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    if req.expected_revision is not None and req.expected_revision != session["revision"]:
+        raise HTTPException(status_code=409, detail=f"Session is at revision {session['revision']}, "
+                                                    f"not {req.expected_revision}")
+
+    if req.target_days:
+        target_days = sorted({d for d in req.target_days if 1 <= d <= session["days"]})
+    else:
+        target_days = parse_target_days(req.instruction, session["days"])
+    if not target_days:
+        raise HTTPException(status_code=400, detail="Specify the days to edit (e.g. 'day 3') or pass target_days")
+
+    try:
+        travel_agent = get_travel_agent()
+        result = await _run_until_disconnect(
+            request, travel_agent.refine_itinerary,
+            session["preference"], session["itinerary"], target_days, req.instruction
+        )
+    except (RateLimitExceeded, RequestCancelled, DeadlineExceeded):
+        raise
+    except (LLMRouterError, CircuitOpenError) as e:
+        logger.error(f"Session edit failed: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Edit failed, LLM unavailable: {str(e)}")
+    except InvalidPatchError as e:
+        logger.error(f"Session edit failed: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Edit failed: {str(e)}")
+    except Exception as e:
+        logger.error(f"Session edit failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    # Another edit may have been saved while this one was generated; don't overwrite it
+    current = await run_in_threadpool(store.get, session_id)
+    if current is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    if current["revision"] != session["revision"]:
+        raise HTTPException(status_code=409, detail=f"Session changed during the edit (now at revision "
+                                                    f"{current['revision']}), retry against the new revision")
+
+    session["itinerary"] = result["itinerary"]
+    session["revision"] += 1
+    session["updated_at"] = time.time()
+    await run_in_threadpool(store.save, session)
+    return {**session, "updated_days": result["updated_days"]}
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    get_session_store().delete(session_id)
+    return {"success": True, "session_id": session_id}
+
+@app.get("/debug/llm-backends")
+def debug_llm_backends():
+    """Debug endpoint exposing per-backend latency stats and hedge deadlines"""
+    router = get_llm_router()
+    return {
+        "backends": router.stats(),
+        "hedge_delays": {b.name: b.hedge_delay() for b in router.backends}
+    }
+
+@app.get("/debug/tiering")
+def debug_tiering():
+    """Debug endpoint exposing model tier decisions and per-tier latency/failure rates"""
+    return get_tiering_policy().report()
+
+@app.get("/debug/rate-limits")
+def debug_rate_limits():
+    """Debug endpoint exposing provider rate limit budgets and wait queues"""
+    return get_rate_limiter().snapshot()
+
+@app.get("/debug/cache")
+def debug_cache():
+    """Debug endpoint exposing itinerary cache statistics"""
+    return get_itinerary_cache().stats()
+
+@app.get("/debug/prewarm")
+def debug_prewarm():
+    """Debug endpoint exposing the last pre-warm report and the most requested combinations"""
+    return {
+        "last_report": prewarm.last_report,
+        "popular": [
+            {"preference": preference, "days": days, "requests": count}
+            for preference, days, count in prewarm.popular_combinations()
+        ]
+    }
+
+@app.get("/debug/semantic-cache")
+def debug_semantic_cache():
+    """Debug endpoint exposing approximate-match similarity scores and the audited false-hit rate"""
+    return get_semantic_cache().stats()
+
+@app.get("/debug/profiles", dependencies=[Depends(require_profiling_token)])
+def debug_profiles():
+    """Debug endpoint listing stored request profiles, newest first"""
+    profiler = get_profiler()
+    if profiler is None:
+        return {"enabled": False, "profiles": []}
+    return {"enabled": True, "profiles": profiler.list_profiles()}
+
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(require_profiling_token)])
+def debug_profile(profile_id: str):
+    """Download a stored profile in collapsed-stack format"""
+    profiler = get_profiler()
+    path = profiler.profile_path(profile_id) if profiler is not None else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.collapsed")
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, validator
+from typing import Any, Dict, List, Optional, Union
+from typing_extensions import Annotated, NotRequired, TypedDict
 
 class TravelState(BaseModel):
     preference: str
@@ -24,6 +25,17 @@ class ItineraryRequest(BaseModel):
             raise ValueError('Days must be between 1 and 30')
         return v
 
+class ItineraryEditRequest(BaseModel):
+    instruction: str = Field(..., min_length=1, max_length=500, description="Edit instruction (e.g., swap day 3 for something more relaxed)")
+    target_days: Optional[List[int]] = Field(None, description="Days to edit; parsed from the instruction when omitted")
+    expected_revision: Optional[int] = Field(None, description="Session revision the edit is based on; rejected with 409 if it is stale")
+    
+    @validator('instruction')
+    def validate_instruction(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Instruction cannot be empty')
+        return v.strip()
+
 class ItineraryResponse(BaseModel):
     success: bool
     itinerary: List[dict]
@@ -36,5 +48,48 @@ class ErrorResponse(BaseModel):
     error: str
     detail: Optional[str] = None
 
+# Itinerary day shapes accepted from the LLM and the fallback generator.
+# TypedDicts validate straight into plain dicts, so no model -> dict dump is needed.
+class AccommodationEntry(TypedDict):
+    __pydantic_config__ = ConfigDict(extra="ignore")
+
+    name: Annotated[str, Field(min_length=1)]
+    url: NotRequired[Optional[str]]
+
+class DayPlan(TypedDict):
+    __pydantic_config__ = ConfigDict(extra="ignore")
+
+    day: Annotated[int, Field(ge=1)]
+    title: str
+    activities: Union[Annotated[List[str], Field(min_length=1)], str]
+    location: str
+    description: NotRequired[str]
+    # "accommodations" (agent prompt) and "accommodation" (fallback generator) are both accepted
+    accommodations: NotRequired[Optional[List[Union[AccommodationEntry, str]]]]
+    accommodation: NotRequired[Optional[str]]
+
+def finish_day(day: Dict[str, Any]) -> Dict[str, Any]:
+    """Bring a validated day into its final shape.
 
+    Wraps a lone activity string, defaults the description, folds
+    accommodation/accommodations into a list of {"name", "url"} entries
+    and adds activity_count.
+    """
+    activities = day["activities"]
+    if isinstance(activities, str):
+        activities = day["activities"] = [activities]
+    if "description" not in day:
+        day["description"] = ""
+    legacy = day.pop("accommodation", None)
+    accommodations = day.get("accommodations")
+    if not accommodations:
+        day["accommodations"] = [{"name": legacy, "url": ""}] if legacy else []
+    else:
+        for i, acc in enumerate(accommodations):
+            if isinstance(acc, str):
+                accommodations[i] = {"name": acc, "url": ""}
+    day["activity_count"] = len(activities)
+    return day
 
+# A day as returned by itinerary parsing: finish_day runs inside the same compiled validation pass
+FinishedDayPlan = Annotated[DayPlan, AfterValidator(finish_day)]
@@ -0,0 +1,233 @@
+"""
+Cache pre-warming for popular preference/day combinations.
+
+Itinerary requests are counted per (preference, days) in the shared store.
+The pre-warm job takes the top N combinations (topped up from a configured
+list), regenerates any that are missing or about to expire at batch
+priority, and reports how much of the recorded traffic is now served from
+cache.
+
+Run from the backend directory, sharing the server's cache file and with
+part of the provider budget set aside for it (the server uses the rest):
+    SHARED_CACHE_PATH=shared_cache.db PREWARM_BUDGET_SHARE=0.2 python -m app.prewarm --top 20
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from .configs import (
+    REQUEST_STATS_TTL,
+    PREWARM_TOP_N,
+    PREWARM_COMBINATIONS,
+    PREWARM_REFRESH_MARGIN,
+    PREWARM_OFF_PEAK_HOURS,
+    PREWARM_INTERVAL,
+    SHARED_CACHE_PATH,
+    SEMANTIC_CACHE_ENABLED,
+    PREWARM_BUDGET_SHARE,
+)
+from .cache import get_itinerary_cache, cache_key
+from .shared_store import get_shared_store
+from .fallback import preference_activities
+from . import rate_limit
+from .rate_limit import RateLimitExceeded, BATCH
+from .circuit_breaker import get_breaker, OPEN
+from .semantic_cache import get_semantic_cache
+
+logger = logging.getLogger(__name__)
+
+STATS_NAMESPACE = "request_stats"
+
+# Most recent report in this process, for /debug/prewarm
+last_report: Optional[Dict[str, Any]] = None
+
+
+def record_request(preference: str, days: int):
+    """Count an itinerary request towards the popularity stats"""
+    get_shared_store().incr(STATS_NAMESPACE, cache_key(preference, days), REQUEST_STATS_TTL)
+
+
+def parse_combinations(spec: str) -> List[Tuple[str, int]]:
+    """Parse "preference:days,preference:days" into pairs"""
+    combinations = []
+    for entry in spec.split(","):
+        preference, sep, days = entry.strip().rpartition(":")
+        if sep and preference and days.isdigit() and 1 <= int(days) <= 30:
+            combinations.append((preference.strip(), int(days)))
+    return combinations
+
+
+def configured_combinations() -> List[Tuple[str, int]]:
+    """PREWARM_COMBINATIONS, or every fallback preference for 2-7 day trips"""
+    if PREWARM_COMBINATIONS:
+        return parse_combinations(PREWARM_COMBINATIONS)
+    return [(preference, days) for preference in preference_activities for days in range(2, 8)]
+
+
+def popular_combinations(top_n: int = PREWARM_TOP_N) -> List[Tuple[str, int, int]]:
+    """Top (preference, days, request_count) by recorded traffic, topped up from the configured list"""
+    combinations = []
+    seen = set()
+    for key, count in get_shared_store().top(STATS_NAMESPACE, top_n):
+        days, _, preference = key.partition(":")
+        combinations.append((preference, int(days), count))
+        seen.add(key)
+    for preference, days in configured_combinations():
+        if len(combinations) >= top_n:
+            break
+        if cache_key(preference, days) not in seen:
+            combinations.append((preference, days, 0))
+            seen.add(cache_key(preference, days))
+    return combinations
+
+
+def parse_off_peak_hours(spec: str = PREWARM_OFF_PEAK_HOURS) -> Tuple[int, int]:
+    """Parse a "start-end" hour window (0-24), raising ValueError if it is malformed"""
+    start, sep, end = spec.partition("-")
+    try:
+        start, end = int(start), int(end)
+    except ValueError:
+        start = end = -1
+    if not sep or not 0 <= start <= 24 or not 0 <= end <= 24:
+        raise ValueError(f"Invalid PREWARM_OFF_PEAK_HOURS '{spec}', expected 'start-end' hours such as '1-6'")
+    return start, end
+
+
+def in_off_peak(now: Optional[datetime] = None, spec: str = PREWARM_OFF_PEAK_HOURS) -> bool:
+    """Whether the local hour falls in the "start-end" off-peak window (may wrap midnight)"""
+    hour = (now or datetime.now()).hour
+    start, end = parse_off_peak_hours(spec)
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def _generate(preference: str, days: int, max_retries: int) -> Optional[Dict[str, Any]]:
+    """Generate at batch priority, waiting out provider rate limits"""
+    from .agent import get_travel_agent
+    travel_agent = get_travel_agent()
+    for attempt in range(max_retries + 1):
+        try:
+            return travel_agent.generate_itinerary(preference, days, priority=BATCH)
+        except RateLimitExceeded as e:
+            if attempt == max_retries:
+                raise
+            logger.info(f"Pre-warm waiting {e.retry_after:.1f}s for {e.scope} capacity")
+            time.sleep(e.retry_after)
+    return None
+
+
+def run_prewarm(top_n: int = PREWARM_TOP_N, refresh_margin: int = PREWARM_REFRESH_MARGIN,
+                max_retries: int = 3) -> Dict[str, Any]:
+    """Warm the cache for the top combinations and return a coverage report"""
+    global last_report
+    started = time.time()
+    cache = get_itinerary_cache()
+    combinations = popular_combinations(top_n)
+    report = {"combinations": len(combinations), "fresh": 0, "generated": 0, "refreshed": 0, "failed": 0}
+    warm_requests = 0
+
+    for preference, days, count in combinations:
+        entry = cache.peek(preference, days)
+        if entry is not None and time.time() - entry.created_at < cache.ttl - refresh_margin:
+            report["fresh"] += 1
+            warm_requests += count
+            continue
+
+        if get_breaker("llm").state == OPEN:
+            logger.warning("LLM circuit breaker open, stopping pre-warm run")
+            report["failed"] += 1
+            break
+
+        try:
+            result = _generate(preference, days, max_retries)
+        except RateLimitExceeded as e:
+            logger.warning(f"Pre-warm skipped {preference}/{days}: {str(e)}")
+            report["failed"] += 1
+            continue
+
+        # Fallback results are not cached, same as on the request path
+        if result and result.get("success") and "note" not in result:
+            cache.set(preference, days, result)
+            if SEMANTIC_CACHE_ENABLED:
+                get_semantic_cache().add(preference, days)
+            report["refreshed" if entry is not None else "generated"] += 1
+            warm_requests += count
+        else:
+            report["failed"] += 1
+
+    total_requests = sum(count for _, count in get_shared_store().top(STATS_NAMESPACE, 100000))
+    warm = report["fresh"] + report["generated"] + report["refreshed"]
+    report.update({
+        "warm": warm,
+        "coverage": warm / len(combinations) if combinations else 0.0,
+        "traffic_coverage": warm_requests / total_requests if total_requests else None,
+        "duration": round(time.time() - started, 2),
+        "finished_at": time.time(),
+    })
+    last_report = report
+    logger.info(f"Pre-warm finished: {report}")
+    return report
+
+
+def prewarm_loop(interval: int, ignore_off_peak: bool = False, top_n: int = PREWARM_TOP_N,
+                 refresh_margin: int = PREWARM_REFRESH_MARGIN):
+    """Run the pre-warm job every interval seconds during off-peak hours"""
+    while True:
+        try:
+            if ignore_off_peak or in_off_peak():
+                run_prewarm(top_n, refresh_margin)
+        except Exception as e:
+            logger.error(f"Pre-warm run failed: {str(e)}")
+        time.sleep(interval)
+
+
+def start_background_prewarm(interval: int = PREWARM_INTERVAL) -> Optional[threading.Thread]:
+    """Start the pre-warm loop in a daemon thread inside the app process"""
+    try:
+        parse_off_peak_hours()
+    except ValueError as e:
+        logger.error(f"Background pre-warm not started: {str(e)}")
+        return None
+    thread = threading.Thread(target=prewarm_loop, args=(interval,), name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warm the itinerary cache for popular requests")
+    parser.add_argument("--top", type=int, default=PREWARM_TOP_N, help="number of combinations to warm")
+    parser.add_argument("--refresh-margin", type=int, default=PREWARM_REFRESH_MARGIN,
+                        help="regenerate entries expiring within this many seconds")
+    parser.add_argument("--loop", action="store_true", help="keep running every --interval seconds")
+    parser.add_argument("--interval", type=int, default=PREWARM_INTERVAL or 3600)
+    parser.add_argument("--ignore-off-peak", action="store_true", help="run outside PREWARM_OFF_PEAK_HOURS")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not SHARED_CACHE_PATH:
+        parser.error("SHARED_CACHE_PATH must point at the server's cache database")
+    if not 0 < PREWARM_BUDGET_SHARE < 1:
+        parser.error("PREWARM_BUDGET_SHARE must set aside part of the provider budget (e.g. 0.2) "
+                     "for this process, with the same value configured for the server")
+    try:
+        parse_off_peak_hours()
+    except ValueError as e:
+        parser.error(str(e))
+    # This process only gets its share of the provider budget; the server workers split the rest
+    rate_limit.rate_limiter = rate_limit.RateLimiter(share=PREWARM_BUDGET_SHARE, workers=1)
+
+    if args.loop:
+        prewarm_loop(args.interval, args.ignore_off_peak, args.top, args.refresh_margin)
+    elif args.ignore_off_peak or in_off_peak():
+        print(json.dumps(run_prewarm(args.top, args.refresh_margin), indent=2))
+    else:
+        print(f"Outside off-peak hours ({PREWARM_OFF_PEAK_HOURS}); pass --ignore-off-peak to run now")
+
+
+if __name__ == "__main__":
+    main()
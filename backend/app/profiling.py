@@ -0,0 +1,232 @@
+"""
+On-demand sampling profiler for individual requests.
+
+When PROFILING_ENABLED is set, an agent run is profiled if the request sends
+"X-Profile: <PROFILING_TOKEN>" or is picked by PROFILING_SAMPLE_RATE. A
+sampler thread, running only while a profile is active, records the stacks of
+the threads working on the run every PROFILING_INTERVAL seconds: the worker
+thread executing it, plus the LLM router and search executor threads, which
+pick up the profile from the submitting context (see in_context). The
+result is written in collapsed-stack format (one "frame;frame;frame count"
+line per stack, ready for flamegraph.pl or speedscope), with a JSON sidecar
+holding request details and the thread's CPU time. At most
+PROFILING_MAX_FILES profiles are kept in PROFILING_DIR.
+
+With profiling disabled, requests pay a single flag check.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from .configs import (
+    PROFILING_ENABLED,
+    PROFILING_TOKEN,
+    PROFILING_SAMPLE_RATE,
+    PROFILING_INTERVAL,
+    PROFILING_MAX_SECONDS,
+    PROFILING_DIR,
+    PROFILING_MAX_FILES,
+)
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = ".collapsed"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    """Stack samples for the threads working on one request"""
+
+    def __init__(self, path: str, trigger: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}"
+        self.path = path
+        self.trigger = trigger
+        self.started = time.time()
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.threads: Dict[int, float] = {}
+        self.cpu_time = 0.0
+        self._lock = threading.Lock()
+
+    def wrap(self, func):
+        """Wrap a function so the thread running it is sampled for this profile"""
+        def profiled(*args, **kwargs):
+            ident = threading.get_ident()
+            cpu_start = time.thread_time()
+            self.threads[ident] = cpu_start
+            token = current_profile.set(self)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                current_profile.reset(token)
+                self.threads.pop(ident, None)
+                with self._lock:
+                    self.cpu_time += time.thread_time() - cpu_start
+        return profiled
+
+    def sample(self, frames: Dict[int, Any]):
+        for ident in list(self.threads):
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+                self.sample_count += 1
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "path": self.path,
+            "trigger": self.trigger,
+            "started": self.started,
+            "wall_seconds": round(time.time() - self.started, 3),
+            "cpu_seconds": round(self.cpu_time, 3),
+            "samples": self.sample_count,
+            "interval": PROFILING_INTERVAL,
+        }
+
+
+# Profile of the request being served by the current thread/context
+current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "request_profile", default=None
+)
+
+
+def in_context(func):
+    """Bind func to a copy of the current context before handing it to an executor thread.
+
+    Context variables (deadline, tier, priority) are carried over, and while
+    the request is profiled the executor thread is sampled for it as well.
+    """
+    profile = current_profile.get()
+    if profile is not None:
+        func = profile.wrap(func)
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+class Profiler:
+    """Runs the sampler thread while profiles are active and stores the results"""
+
+    def __init__(self, directory: str = PROFILING_DIR, max_files: int = PROFILING_MAX_FILES,
+                 interval: float = PROFILING_INTERVAL):
+        self.directory = directory
+        self.max_files = max_files
+        self.interval = interval
+        self._active: List[RequestProfile] = []
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    def should_profile(self, profile_header: Optional[str]) -> Optional[str]:
+        """Return the trigger ("header" or "sampled") if this request should be profiled"""
+        if PROFILING_TOKEN and profile_header and secrets.compare_digest(profile_header, PROFILING_TOKEN):
+            return "header"
+        if PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE:
+            return "sampled"
+        return None
+
+    def start(self, path: str, trigger: str) -> RequestProfile:
+        profile = RequestProfile(path, trigger)
+        with self._lock:
+            self._active.append(profile)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._sampler.start()
+        return profile
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                now = time.time()
+                self._active = [p for p in self._active if now - p.started < PROFILING_MAX_SECONDS]
+                if not self._active:
+                    self._sampler = None
+                    return
+                active = list(self._active)
+            frames = sys._current_frames()
+            frames.pop(own, None)
+            for profile in active:
+                profile.sample(frames)
+            time.sleep(self.interval)
+
+    def finish(self, profile: RequestProfile) -> Optional[str]:
+        """Stop sampling a profile and write it out; returns the profile id"""
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+        if not profile.samples:
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, profile.id)
+            with open(base + PROFILE_SUFFIX, "w", encoding="utf-8") as f:
+                for stack, count in profile.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            with open(base + ".json", "w", encoding="utf-8") as f:
+                json.dump(profile.metadata(), f)
+            self._prune()
+        except OSError as e:
+            logger.error(f"Failed to write profile {profile.id}: {str(e)}")
+            return None
+        logger.info(f"Saved profile {profile.id} for {profile.path} ({profile.sample_count} samples)")
+        return profile.id
+
+    def _prune(self):
+        profiles = sorted(
+            (name for name in os.listdir(self.directory) if name.endswith(PROFILE_SUFFIX)),
+            key=lambda name: os.path.getmtime(os.path.join(self.directory, name))
+        )
+        for name in profiles[:max(0, len(profiles) - self.max_files)]:
+            base = os.path.join(self.directory, name[:-len(PROFILE_SUFFIX)])
+            for path in (base + PROFILE_SUFFIX, base + ".json"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(PROFILE_SUFFIX):
+                continue
+            base = os.path.join(self.directory, name[:-len(PROFILE_SUFFIX)])
+            try:
+                with open(base + ".json", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                meta = {"id": name[:-len(PROFILE_SUFFIX)]}
+            meta["size"] = os.path.getsize(base + PROFILE_SUFFIX)
+            profiles.append(meta)
+        return sorted(profiles, key=lambda m: m.get("started", 0), reverse=True)
+
+    def profile_path(self, profile_id: str) -> Optional[str]:
+        """Path of a stored profile, or None for unknown ids"""
+        if profile_id not in {p["id"] for p in self.list_profiles()}:
+            return None
+        return os.path.join(self.directory, profile_id + PROFILE_SUFFIX)
+
+
+# Create a global instance
+profiler = None
+
+def get_profiler() -> Optional[Profiler]:
+    """Get or create the profiler instance (None while profiling is disabled)."""
+    global profiler
+    if profiler is None and PROFILING_ENABLED:
+        profiler = Profiler()
+    return profiler
@@ -0,0 +1,333 @@
+"""
+Provider-aware rate limiting and per-client quotas.
+
+Each provider (Groq, OpenAI, Tavily) is modelled by token buckets for its
+requests-per-minute and tokens-per-minute budgets. An agent run is admitted
+against its estimated LLM budget before its first call, so it is rejected
+up front (HTTP 429) instead of running out of budget halfway; its calls
+then draw from that admission. Calls beyond it (extra agent steps,
+failover to another provider, hedges) and searches reserve their own
+budget right before they are sent. A request waits briefly for capacity or
+is rejected instead of exceeding the provider limit. Waiters are served in
+priority order: interactive UI requests ahead of batch/catalog jobs.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Tuple
+
+from .configs import (
+    GROQ_RPM,
+    GROQ_TPM,
+    TAVILY_RPM,
+    OPENAI_RPM,
+    OPENAI_TPM,
+    RATE_LIMIT_MAX_WAIT,
+    LLM_CALL_COMPLETION_TOKENS,
+    AGENT_RUN_LLM_CALLS,
+    AGENT_RUN_PROMPT_TOKENS,
+    AGENT_RUN_TOKENS_PER_DAY,
+    CLIENT_QUOTA_PER_MINUTE,
+    CLIENT_QUOTA_OVERRIDES,
+    CLIENT_API_KEYS,
+    WORKERS,
+    PREWARM_BUDGET_SHARE,
+)
+from .shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+# Scheduling priorities (lower runs first)
+INTERACTIVE = 0
+BATCH = 1
+
+# Shared-store namespace of the per-client request counters
+QUOTA_NAMESPACE = "client_quota"
+
+# Priority of provider calls made in the current request context
+current_priority: ContextVar[int] = ContextVar("rate_limit_priority", default=INTERACTIVE)
+
+# Budget admitted for the agent run in the current request context
+current_run_budget: ContextVar[Optional["RunBudget"]] = ContextVar("rate_limit_run_budget", default=None)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when capacity is not available within the allowed wait"""
+
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit exceeded for {scope}, retry after {retry_after:.1f}s")
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute / 60 per second.
+
+    Not thread-safe on its own; callers hold their own lock.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount tokens are available (amount is capped at capacity)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+
+class ProviderLimiter:
+    """Requests/tokens per minute budget for one provider with a priority wait queue"""
+
+    def __init__(self, name: str, rpm: int, tpm: Optional[int] = None):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self.granted = 0
+        self.rejected = 0
+
+    def _wait_time(self, requests: int, tokens: int) -> float:
+        wait = self.requests.wait_time(requests)
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    def acquire(self, requests: int = 1, tokens: int = 0, priority: int = INTERACTIVE,
+                max_wait: float = RATE_LIMIT_MAX_WAIT):
+        """Block until the budget is available, or raise RateLimitExceeded.
+
+        Only the highest-priority waiter may consume capacity. If the head of
+        the queue cannot be served within its remaining wait, it is rejected
+        immediately rather than after sleeping out the deadline.
+        """
+        entry = (priority, next(self._seq))
+        deadline = time.monotonic() + max_wait
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if self._waiters[0] == entry:
+                        wait = self._wait_time(requests, tokens)
+                        if wait == 0:
+                            self.requests.consume(requests)
+                            if self.tokens is not None and tokens:
+                                self.tokens.consume(tokens)
+                            self.granted += 1
+                            return
+                        if wait > remaining:
+                            self.rejected += 1
+                            raise RateLimitExceeded(self.name, wait)
+                        self._cond.wait(wait)
+                    else:
+                        if remaining <= 0:
+                            self.rejected += 1
+                            raise RateLimitExceeded(self.name, self._wait_time(requests, tokens))
+                        self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            self.requests._refill()
+            data = {
+                "requests_available": round(self.requests.tokens, 2),
+                "requests_per_minute": self.requests.capacity,
+                "waiting": len(self._waiters),
+                "granted": self.granted,
+                "rejected": self.rejected,
+            }
+            if self.tokens is not None:
+                self.tokens._refill()
+                data["tokens_available"] = round(self.tokens.tokens, 2)
+                data["tokens_per_minute"] = self.tokens.capacity
+            return data
+
+
+def estimate_call_tokens(messages: Any) -> int:
+    """Estimate the tokens of one LLM call: ~4 characters per prompt token plus the completion"""
+    return len(str(messages)) // 4 + LLM_CALL_COMPLETION_TOKENS
+
+
+def estimate_run_tokens(days: int) -> int:
+    """Estimate the tokens of a whole agent run for an itinerary of the given length"""
+    return AGENT_RUN_LLM_CALLS * (AGENT_RUN_PROMPT_TOKENS + LLM_CALL_COMPLETION_TOKENS) + days * AGENT_RUN_TOKENS_PER_DAY
+
+
+class RunBudget:
+    """LLM budget admitted for one agent run, drawn down by the run's calls to its provider"""
+
+    def __init__(self, provider: str, requests: int, tokens: int):
+        self.provider = provider
+        self.requests = requests
+        self.tokens = tokens
+        self._lock = threading.Lock()
+
+    def draw(self, provider: str, tokens: int) -> Tuple[int, int]:
+        """Cover one call from the admitted budget; returns the (requests, tokens) still to reserve"""
+        if provider != self.provider:
+            return 1, tokens
+        with self._lock:
+            requests = 0 if self.requests > 0 else 1
+            self.requests -= 1 - requests
+            covered = min(tokens, self.tokens)
+            self.tokens -= covered
+        return requests, tokens - covered
+
+
+def per_worker(limit: int, share: float = 1.0, workers: int = WORKERS) -> int:
+    """This process's part of an account-wide provider budget: a share of it, split across workers"""
+    return max(1, int(limit * share) // workers)
+
+
+class RateLimiter:
+    """Registry of provider limiters, reserved per agent run and per provider call.
+
+    Server workers split what is left after PREWARM_BUDGET_SHARE; the
+    separate pre-warm process is created with share=PREWARM_BUDGET_SHARE
+    and workers=1, so together they stay within the provider limits.
+    """
+
+    def __init__(self, share: float = 1.0 - PREWARM_BUDGET_SHARE, workers: int = WORKERS):
+        self.share = share
+        self.providers = {
+            "tavily": ProviderLimiter("tavily", per_worker(TAVILY_RPM, share, workers)),
+            "groq": ProviderLimiter("groq", per_worker(GROQ_RPM, share, workers),
+                                    per_worker(GROQ_TPM, share, workers)),
+            "openai": ProviderLimiter("openai", per_worker(OPENAI_RPM, share, workers),
+                                      per_worker(OPENAI_TPM, share, workers)),
+        }
+
+    def admit_run(self, provider: str, requests: int, tokens: int, priority: Optional[int] = None,
+                  max_wait: float = RATE_LIMIT_MAX_WAIT) -> RunBudget:
+        """Reserve an agent run's estimated budget up front or raise RateLimitExceeded"""
+        limiter = self.providers.get(provider)
+        if limiter is not None:
+            limiter.acquire(requests, tokens, priority=current_priority.get() if priority is None else priority,
+                            max_wait=max_wait)
+        return RunBudget(provider, requests, tokens)
+
+    def reserve_llm_call(self, provider: str, tokens: int, priority: Optional[int] = None,
+                         max_wait: float = RATE_LIMIT_MAX_WAIT, use_run_budget: bool = True):
+        """Reserve one request and its estimated tokens from an LLM provider's budget.
+
+        Inside an admitted agent run, the call is covered by the run's budget
+        first and only what it needs beyond that is reserved here.
+        """
+        limiter = self.providers.get(provider)
+        if limiter is None:
+            return
+        requests = 1
+        budget = current_run_budget.get()
+        if use_run_budget and budget is not None:
+            requests, tokens = budget.draw(provider, tokens)
+        if requests or tokens:
+            limiter.acquire(requests, tokens, priority=current_priority.get() if priority is None else priority,
+                            max_wait=max_wait)
+
+    def reserve_search(self, priority: Optional[int] = None, max_wait: float = RATE_LIMIT_MAX_WAIT):
+        """Reserve one search request"""
+        self.providers["tavily"].acquire(
+            1, priority=current_priority.get() if priority is None else priority, max_wait=max_wait
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: limiter.snapshot() for name, limiter in self.providers.items()}
+
+
+def _parse_overrides(spec: str) -> Dict[str, int]:
+    overrides = {}
+    for entry in spec.split(","):
+        key, sep, limit = entry.strip().rpartition(":")
+        if sep and key:
+            try:
+                overrides[key] = int(limit)
+            except ValueError:
+                logger.warning(f"Invalid client quota override '{entry}', skipping")
+    return overrides
+
+
+class ClientQuotas:
+    """Per-client requests-per-minute quotas.
+
+    Only configured API keys (overrides or CLIENT_API_KEYS) get their own
+    quota; any other client is keyed by IP, so inventing new keys does not
+    reset the quota. Counts are kept in the cache store as one-minute
+    windows, so with several workers every worker sees the same count and
+    the full quota applies account-wide rather than per worker.
+    """
+
+    def __init__(self, default_rpm: int = CLIENT_QUOTA_PER_MINUTE,
+                 overrides: Optional[Dict[str, int]] = None, api_keys: Optional[set] = None,
+                 store=None, window: float = 60.0):
+        self.default_rpm = default_rpm
+        self.overrides = overrides if overrides is not None else _parse_overrides(CLIENT_QUOTA_OVERRIDES)
+        if api_keys is None:
+            api_keys = {key.strip() for key in CLIENT_API_KEYS.split(",") if key.strip()}
+        self.api_keys = api_keys | set(self.overrides)
+        self.store = store if store is not None else get_shared_store()
+        self.window = window
+
+    def client_key(self, api_key: Optional[str], client_ip: str) -> str:
+        """Quota key: the API key if it is a configured one, otherwise the client IP"""
+        if api_key and api_key in self.api_keys:
+            return f"key:{api_key}"
+        return f"ip:{client_ip}"
+
+    def limit_for(self, client_key: str) -> int:
+        if client_key.startswith("key:"):
+            return self.overrides.get(client_key[len("key:"):], self.default_rpm)
+        return self.default_rpm
+
+    def check(self, client_key: str):
+        """Count one request against the client's quota or raise RateLimitExceeded"""
+        count = self.store.incr(QUOTA_NAMESPACE, client_key, self.window)
+        if count > self.limit_for(client_key):
+            item = self.store.get(QUOTA_NAMESPACE, client_key)
+            retry_after = item[1] + self.window - time.time() if item is not None else self.window
+            raise RateLimitExceeded("client", max(0.0, retry_after))
+
+
+# Create global instances
+rate_limiter = None
+client_quotas = None
+
+def get_rate_limiter() -> RateLimiter:
+    """Get or create the provider rate limiter instance."""
+    global rate_limiter
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
+    return rate_limiter
+
+def get_client_quotas() -> ClientQuotas:
+    """Get or create the client quota instance."""
+    global client_quotas
+    if client_quotas is None:
+        client_quotas = ClientQuotas()
+    return client_quotas
@@ -0,0 +1,115 @@
+"""
+Fast response path for itinerary payloads.
+
+Payloads are serialized once with orjson (falling back to compact stdlib
+json), tagged with a strong ETag, and compressed lazily per encoding. The
+resulting SerializedBody is stored alongside cached itineraries, so repeat
+requests cost a dict lookup plus a header comparison.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+from .configs import COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """Parse JSON bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class SerializedBody:
+    """Pre-serialized JSON body with its strong ETag and memoized compressed variants"""
+
+    def __init__(self, payload: Any):
+        self.body = dumps(payload)
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = _compress(self.body, encoding)
+            with self._lock:
+                self._encoded[encoding] = data
+        return data
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header (q=0 entries are excluded)"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def json_response(request: Request, serialized: SerializedBody) -> Response:
+    """Build a conditional, optionally compressed JSON response"""
+    headers = {
+        "ETag": serialized.etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, serialized.etag):
+        return Response(status_code=304, headers=headers)
+
+    body = serialized.body
+    if len(body) >= COMPRESSION_MIN_SIZE:
+        encoding = _choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding:
+            body = serialized.encoded(encoding)
+            headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type="application/json", headers=headers)
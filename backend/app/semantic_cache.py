@@ -0,0 +1,302 @@
+"""
+Approximate itinerary cache for near-duplicate free-text preferences.
+
+Cached preferences are turned into sparse TF-IDF vectors (stemmed words plus
+travel-theme concepts, so "monasteries and culture" and "Buddhist culture"
+share features) and kept in an in-memory inverted index per trip length. A
+request that misses the exact-key cache is compared against the entries for
+the same number of days: a close match is served directly, a weaker one
+seeds the agent with the cached itinerary.
+
+A sample of served matches is regenerated in the background and compared
+with what was served, giving the false-hit rate used to tune the threshold.
+"""
+import logging
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from .configs import (
+    ITINERARY_CACHE_MAX_ENTRIES,
+    SEMANTIC_SERVE_THRESHOLD,
+    SEMANTIC_SEED_THRESHOLD,
+    SEMANTIC_AUDIT_RATE,
+    SEMANTIC_AUDIT_MIN_AGREEMENT,
+    SEMANTIC_SYNC_INTERVAL,
+)
+from .cache import get_itinerary_cache, cache_key, normalize_preference
+from .shared_store import get_shared_store
+from .rate_limit import RateLimitExceeded, BATCH
+
+logger = logging.getLogger(__name__)
+
+# Match actions
+SERVE = "serve"
+SEED = "seed"
+
+STOPWORDS = {
+    "a", "an", "and", "or", "the", "with", "for", "of", "in", "on", "at", "to", "from", "some", "lot", "lots",
+    "i", "we", "me", "us", "my", "our", "want", "wants", "like", "love", "enjoy", "interested", "interest",
+    "trip", "travel", "tour", "holiday", "vacation", "sikkim", "plus", "also", "more", "less", "very",
+    "really", "mostly", "mainly", "focus", "focused", "based", "experience", "experiences", "things",
+}
+
+# Travel themes (the fallback preference keys plus a few more), keyed by the stemmed words that imply them
+CONCEPTS = {
+    "culture": {"culture", "cultural", "heritage", "tradition", "traditional", "museum", "history", "historical",
+                "local", "festival", "food", "cuisine", "market", "art", "craft", "handicraft", "monastery",
+                "buddhist", "tibetan", "architecture"},
+    "spiritual": {"spiritual", "spirituality", "monastery", "buddhist", "buddhism", "temple", "gompa", "stupa",
+                  "meditation", "meditate", "prayer", "pilgrimage", "retreat", "religious", "peace", "peaceful"},
+    "adventure": {"adventure", "adventurous", "trek", "trekking", "hike", "hiking", "raft", "rafting",
+                  "paragliding", "climb", "climbing", "bike", "biking", "camp", "camping", "thrill", "outdoor"},
+    "nature": {"nature", "natural", "lake", "valley", "flower", "mountain", "view", "scenic", "scenery",
+               "wildlife", "bird", "birding", "forest", "waterfall", "glacier", "rhododendron", "landscape",
+               "sunrise", "snow", "himalaya", "himalayan"},
+    "relaxation": {"relax", "relaxed", "relaxing", "leisure", "leisurely", "spa", "slow", "easy", "calm",
+                   "family", "honeymoon", "romantic", "comfort", "comfortable"},
+}
+_WORD_CONCEPTS: Dict[str, List[str]] = {}
+for _concept, _words in CONCEPTS.items():
+    for _word in _words:
+        _WORD_CONCEPTS.setdefault(_word, []).append(_concept)
+
+# Concepts count less than the words themselves so distinct wording within a theme still matters
+CONCEPT_WEIGHT = 0.7
+
+
+def _stem(word: str) -> str:
+    """Crude plural stripping: monasteries -> monastery, lakes -> lake"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+def features(text: str) -> Dict[str, float]:
+    """Term weights for a piece of text: stemmed words plus "#concept" features"""
+    counts: Counter = Counter()
+    for word in re.findall(r"[a-z]+", normalize_preference(text)):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        word = _stem(word)
+        counts[word] += 1.0
+        for concept in _WORD_CONCEPTS.get(word, ()):
+            counts["#" + concept] += CONCEPT_WEIGHT
+    return dict(counts)
+
+
+def cosine(a: Dict[str, float], b: Dict[str, float], idf: Optional[Dict[str, float]] = None) -> float:
+    """Cosine similarity of two sparse vectors, optionally IDF-weighted"""
+    if not a or not b:
+        return 0.0
+    weight = (lambda t: idf.get(t, 1.0)) if idf is not None else (lambda t: 1.0)
+    dot = sum(v * b[t] * weight(t) ** 2 for t, v in a.items() if t in b)
+    if dot == 0:
+        return 0.0
+    norm_a = math.sqrt(sum((v * weight(t)) ** 2 for t, v in a.items()))
+    norm_b = math.sqrt(sum((v * weight(t)) ** 2 for t, v in b.items()))
+    return dot / (norm_a * norm_b)
+
+
+def itinerary_text(itinerary: List[Dict[str, Any]]) -> str:
+    """Locations, titles and activities of an itinerary as one string"""
+    return " ".join(
+        " ".join([day.get("location", ""), day.get("title", "")] + list(day.get("activities") or []))
+        for day in itinerary
+    )
+
+
+class SemanticMatch:
+    """A similar cached preference for the same number of days"""
+
+    def __init__(self, preference: str, days: int, score: float, action: str):
+        self.preference = preference
+        self.days = days
+        self.score = score
+        self.action = action
+
+
+class SemanticCache:
+    """Inverted index of cached preferences with TF-IDF cosine lookup"""
+
+    def __init__(self, serve_threshold: float = SEMANTIC_SERVE_THRESHOLD,
+                 seed_threshold: float = SEMANTIC_SEED_THRESHOLD,
+                 max_entries: int = ITINERARY_CACHE_MAX_ENTRIES, store=None):
+        self.serve_threshold = serve_threshold
+        self.seed_threshold = seed_threshold
+        self.max_entries = max_entries
+        self.store = store
+        # cache_key -> (days, normalized preference, feature vector)
+        self._entries: OrderedDict = OrderedDict()
+        self._postings: Dict[str, set] = {}
+        self._df: Counter = Counter()
+        self._lock = threading.Lock()
+        self._synced_at = 0.0
+        self._audit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-audit")
+
+        self.lookups = 0
+        self.served = 0
+        self.seeded = 0
+        self.misses = 0
+        self.audited = 0
+        self.false_hits = 0
+        self.score_histogram = [0] * 10
+        self.recent_matches = deque(maxlen=50)
+        self.recent_audits = deque(maxlen=20)
+
+    def add(self, preference: str, days: int):
+        key = cache_key(preference, days)
+        vector = features(preference)
+        if not vector:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = (days, normalize_preference(preference), vector)
+            for term in vector:
+                self._postings.setdefault(term, set()).add(key)
+                self._df[term] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, preference: str, days: int):
+        with self._lock:
+            self._remove(cache_key(preference, days))
+
+    def _remove(self, key: str):
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        for term in item[2]:
+            self._postings[term].discard(key)
+            self._df[term] -= 1
+            if not self._postings[term]:
+                del self._postings[term]
+                del self._df[term]
+
+    def _sync(self):
+        """Index entries other workers wrote to the shared store"""
+        if self.store is None or time.time() - self._synced_at < SEMANTIC_SYNC_INTERVAL:
+            return
+        self._synced_at = time.time()
+        for key in self.store.keys("itinerary"):
+            days, _, preference = key.partition(":")
+            if key not in self._entries and days.isdigit():
+                self.add(preference, int(days))
+
+    def lookup(self, preference: str, days: int) -> Optional[SemanticMatch]:
+        """Best match for the same number of days if it clears the seed threshold"""
+        self._sync()
+        query = features(preference)
+        best_score, best = 0.0, None
+        with self._lock:
+            total = len(self._entries)
+            idf = {t: math.log((total + 1) / (self._df.get(t, 0) + 1)) + 1 for t in query}
+            candidates = set()
+            for term in query:
+                candidates.update(self._postings.get(term, ()))
+            for key in candidates:
+                entry_days, entry_preference, vector = self._entries[key]
+                if entry_days != days:
+                    continue
+                for term in vector:
+                    if term not in idf:
+                        idf[term] = math.log((total + 1) / (self._df[term] + 1)) + 1
+                score = cosine(query, vector, idf)
+                if score > best_score:
+                    best_score, best = score, entry_preference
+
+            self.lookups += 1
+            self.score_histogram[min(9, int(best_score * 10))] += 1
+            if best is not None and best_score >= self.serve_threshold:
+                action = SERVE
+                self.served += 1
+            elif best is not None and best_score >= self.seed_threshold:
+                action = SEED
+                self.seeded += 1
+            else:
+                action = None
+                self.misses += 1
+            self.recent_matches.append({
+                "preference": normalize_preference(preference),
+                "days": days,
+                "closest": best,
+                "score": round(best_score, 3),
+                "action": action or "miss",
+            })
+        return SemanticMatch(best, days, best_score, action) if action else None
+
+    def maybe_audit(self, preference: str, days: int, match: SemanticMatch, served: Dict[str, Any]):
+        """Regenerate a sample of served matches in the background to measure false hits"""
+        if SEMANTIC_AUDIT_RATE > 0 and random.random() < SEMANTIC_AUDIT_RATE:
+            self._audit_executor.submit(self._audit, preference, days, match, served)
+
+    def _audit(self, preference: str, days: int, match: SemanticMatch, served: Dict[str, Any]):
+        from .agent import get_travel_agent
+        try:
+            fresh = get_travel_agent().generate_itinerary(preference, days, priority=BATCH)
+        except RateLimitExceeded:
+            logger.info("Skipping semantic cache audit, no provider capacity")
+            return
+        except Exception as e:
+            logger.warning(f"Semantic cache audit failed: {str(e)}")
+            return
+        if not fresh.get("success") or "note" in fresh:
+            return
+
+        agreement = cosine(features(itinerary_text(served["itinerary"])), features(itinerary_text(fresh["itinerary"])))
+        false_hit = agreement < SEMANTIC_AUDIT_MIN_AGREEMENT
+        with self._lock:
+            self.audited += 1
+            self.false_hits += int(false_hit)
+            self.recent_audits.append({
+                "preference": normalize_preference(preference),
+                "served_preference": match.preference,
+                "days": days,
+                "score": round(match.score, 3),
+                "agreement": round(agreement, 3),
+                "false_hit": false_hit,
+            })
+        # The exact result is cached too, so later requests for this wording skip the approximation
+        get_itinerary_cache().set(preference, days, fresh)
+        self.add(preference, days)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "serve_threshold": self.serve_threshold,
+                "seed_threshold": self.seed_threshold,
+                "lookups": self.lookups,
+                "served": self.served,
+                "seeded": self.seeded,
+                "misses": self.misses,
+                "audited": self.audited,
+                "false_hits": self.false_hits,
+                "false_hit_rate": self.false_hits / self.audited if self.audited else None,
+                "score_histogram": {f"{i / 10:.1f}-{(i + 1) / 10:.1f}": n for i, n in enumerate(self.score_histogram)},
+                "recent_matches": list(self.recent_matches),
+                "recent_audits": list(self.recent_audits),
+            }
+
+
+# Create a global instance
+semantic_cache = None
+
+def get_semantic_cache() -> SemanticCache:
+    """Get or create the semantic cache instance."""
+    global semantic_cache
+    if semantic_cache is None:
+        store = get_shared_store()
+        semantic_cache = SemanticCache(store=store if store.shared else None)
+    return semantic_cache
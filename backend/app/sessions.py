@@ -0,0 +1,99 @@
+"""
+Itinerary refinement sessions.
+
+A session keeps a generated itinerary server-side (bounded count, expiring
+after SESSION_TTL of inactivity) so that follow-up edits can regenerate only
+the targeted days and merge them into the stored trip.
+"""
+import re
+import secrets
+import time
+from typing import Dict, Any, List, Optional
+
+from .configs import SESSION_TTL, SESSION_MAX_SESSIONS
+from .responses import dumps, loads
+from .shared_store import get_shared_store, MemoryStore
+
+# "day 3", "days 2 and 4", "days 2-4", "day 1, 3 & 5"
+_DAY_REFERENCE = re.compile(r"\bdays?\s+(\d+(?:\s*(?:,|&|and|-|–|to)\s*\d+)*)", re.IGNORECASE)
+_DAY_RANGE = re.compile(r"(\d+)\s*(?:-|–|to)\s*(\d+)")
+
+
+def parse_target_days(instruction: str, total_days: int) -> List[int]:
+    """Extract the day numbers an edit instruction refers to"""
+    days = set()
+    for match in _DAY_REFERENCE.finditer(instruction or ""):
+        group = match.group(1)
+        for start, end in _DAY_RANGE.findall(group):
+            days.update(range(int(start), int(end) + 1))
+        days.update(int(n) for n in re.findall(r"\d+", _DAY_RANGE.sub("", group)))
+    return sorted(d for d in days if 1 <= d <= total_days)
+
+
+def merge_days(itinerary: List[Dict[str, Any]], patch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Replace days of an itinerary with the patched days of the same number"""
+    patched = {day.get("day"): day for day in patch}
+    return [patched.get(day.get("day"), day) for day in itinerary]
+
+
+def summarize_other_days(itinerary: List[Dict[str, Any]], target_days: List[int]) -> str:
+    """Compact one-line-per-day context for the days that are not being edited"""
+    return "\n".join(
+        f"Day {day.get('day')}: {day.get('title', '')} ({day.get('location', '')})"
+        for day in itinerary if day.get("day") not in target_days
+    )
+
+
+class SessionStore:
+    """Stores refinement sessions in the shared cache store.
+
+    Without a shared store, sessions get an in-memory store of their own,
+    so they are not evicted by search results and other cache entries
+    competing for the same LRU before SESSION_TTL is up.
+    """
+
+    namespace = "session"
+
+    def __init__(self, ttl: int = SESSION_TTL, max_sessions: int = SESSION_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        store = get_shared_store()
+        self.store = store if store.shared else MemoryStore(max_entries=max_sessions)
+
+    def create(self, preference: str, days: int, itinerary: List[Dict[str, Any]]) -> Dict[str, Any]:
+        now = time.time()
+        session = {
+            "session_id": secrets.token_urlsafe(16),
+            "preference": preference,
+            "days": days,
+            "itinerary": itinerary,
+            "revision": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.save(session)
+        if self.store.count(self.namespace) > self.max_sessions:
+            self.store.evict_oldest(self.namespace, self.max_sessions)
+        return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        item = self.store.get(self.namespace, session_id)
+        return loads(item[0]) if item else None
+
+    def save(self, session: Dict[str, Any]):
+        # Re-saving refreshes the expiry, so active sessions stay alive
+        self.store.set(self.namespace, session["session_id"], dumps(session), self.ttl)
+
+    def delete(self, session_id: str):
+        self.store.delete(self.namespace, session_id)
+
+
+# Create a global instance
+session_store = None
+
+def get_session_store() -> SessionStore:
+    """Get or create the session store instance."""
+    global session_store
+    if session_store is None:
+        session_store = SessionStore()
+    return session_store
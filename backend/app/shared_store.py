@@ -0,0 +1,223 @@
+"""
+Cross-process key/value store for caches.
+
+With SHARED_CACHE_PATH set, entries live in a SQLite database in WAL mode so
+every uvicorn worker reads and writes the same itinerary and search caches.
+Without it, a bounded in-process store with the same interface is used.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from .configs import SHARED_CACHE_PATH, SHARED_CACHE_PURGE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore:
+    """In-process TTL store (single worker)"""
+
+    shared = False
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        """Return (value, created_at) or None if missing or expired"""
+        with self._lock:
+            item = self._entries.get((namespace, key))
+            if item is None:
+                return None
+            value, created_at, expires_at = item
+            if expires_at < time.time():
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return value, created_at
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: float, created_at: Optional[float] = None):
+        created_at = created_at if created_at is not None else time.time()
+        with self._lock:
+            self._entries[(namespace, key)] = (value, created_at, created_at + ttl)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            return sum(1 for ns, _ in self._entries if ns == namespace)
+
+    def keys(self, namespace: str) -> List[str]:
+        """Unexpired keys of a namespace"""
+        now = time.time()
+        with self._lock:
+            return [k[1] for k, v in self._entries.items() if k[0] == namespace and v[2] >= now]
+
+    def incr(self, namespace: str, key: str, ttl: float) -> int:
+        """Increment a counter; an expired counter restarts at 1 with a new ttl"""
+        now = time.time()
+        with self._lock:
+            item = self._entries.get((namespace, key))
+            if item is None or item[2] < now:
+                item = (1, now, now + ttl)
+            else:
+                item = (item[0] + 1, item[1], item[2])
+            self._entries[(namespace, key)] = item
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return item[0]
+
+    def top(self, namespace: str, n: int) -> List[Tuple[str, int]]:
+        """The n highest unexpired counters of a namespace"""
+        now = time.time()
+        with self._lock:
+            counters = [(k[1], v[0]) for k, v in self._entries.items() if k[0] == namespace and v[2] >= now]
+        return sorted(counters, key=lambda c: c[1], reverse=True)[:n]
+
+    def evict_oldest(self, namespace: str, keep: int):
+        """Drop the oldest entries of a namespace so that at most keep remain"""
+        with self._lock:
+            keys = sorted((k for k in self._entries if k[0] == namespace), key=lambda k: self._entries[k][1])
+            for k in keys[:max(0, len(keys) - keep)]:
+                del self._entries[k]
+
+
+class SQLiteStore:
+    """SQLite-backed TTL store shared between worker processes"""
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        """Return (value, created_at) or None if missing or expired"""
+        row = self._connection().execute(
+            "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ? AND expires_at >= ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: float, created_at: Optional[float] = None):
+        created_at = created_at if created_at is not None else time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, value, created_at, created_at + ttl)
+        )
+
+    def delete(self, namespace: str, key: str):
+        self._connection().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def count(self, namespace: str) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM cache WHERE namespace = ? AND expires_at >= ?", (namespace, time.time())
+        ).fetchone()[0]
+
+    def keys(self, namespace: str) -> List[str]:
+        """Unexpired keys of a namespace"""
+        return [row[0] for row in self._connection().execute(
+            "SELECT key FROM cache WHERE namespace = ? AND expires_at >= ?", (namespace, time.time())
+        )]
+
+    def incr(self, namespace: str, key: str, ttl: float) -> int:
+        """Increment a counter; an expired counter restarts at 1 with a new ttl"""
+        now = time.time()
+        return self._connection().execute(
+            "INSERT INTO cache (namespace, key, value, created_at, expires_at) VALUES (?, ?, 1, ?, ?)"
+            " ON CONFLICT (namespace, key) DO UPDATE SET"
+            " value = CASE WHEN expires_at < excluded.created_at THEN 1 ELSE value + 1 END,"
+            " created_at = CASE WHEN expires_at < excluded.created_at THEN excluded.created_at ELSE created_at END,"
+            " expires_at = CASE WHEN expires_at < excluded.created_at THEN excluded.expires_at ELSE expires_at END"
+            " RETURNING value",
+            (namespace, key, now, now + ttl)
+        ).fetchone()[0]
+
+    def top(self, namespace: str, n: int) -> List[Tuple[str, int]]:
+        """The n highest unexpired counters of a namespace"""
+        return [tuple(row) for row in self._connection().execute(
+            "SELECT key, value FROM cache WHERE namespace = ? AND expires_at >= ? ORDER BY value DESC LIMIT ?",
+            (namespace, time.time(), n)
+        )]
+
+    def evict_oldest(self, namespace: str, keep: int):
+        """Drop the oldest entries of a namespace so that at most keep remain"""
+        self._connection().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key NOT IN"
+            " (SELECT key FROM cache WHERE namespace = ? ORDER BY created_at DESC LIMIT ?)",
+            (namespace, namespace, keep)
+        )
+
+    def purge_expired(self) -> int:
+        """Delete expired rows; reads skip them anyway, this keeps the file from growing"""
+        return self._connection().execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),)).rowcount
+
+
+def purge_loop(store: SQLiteStore, interval: int):
+    """Purge expired rows from the store every interval seconds"""
+    while True:
+        time.sleep(interval)
+        try:
+            purged = store.purge_expired()
+            if purged:
+                logger.info(f"Purged {purged} expired cache rows")
+        except sqlite3.Error as e:
+            logger.warning(f"Cache purge failed: {str(e)}")
+
+
+def start_background_purge(interval: int = SHARED_CACHE_PURGE_INTERVAL) -> Optional[threading.Thread]:
+    """Start the purge loop in a daemon thread when the shared SQLite store is in use"""
+    store = get_shared_store()
+    if not store.shared or interval <= 0:
+        return None
+    thread = threading.Thread(target=purge_loop, args=(store, interval), name="cache-purge", daemon=True)
+    thread.start()
+    return thread
+
+
+# Create a global instance
+shared_store = None
+
+def get_shared_store():
+    """Get or create the cache store (SQLite when SHARED_CACHE_PATH is set)."""
+    global shared_store
+    if shared_store is None:
+        if SHARED_CACHE_PATH:
+            shared_store = SQLiteStore(SHARED_CACHE_PATH)
+            logger.info(f"Using shared cache store at {SHARED_CACHE_PATH}")
+        else:
+            shared_store = MemoryStore()
+    return shared_store
@@ -0,0 +1,142 @@
+"""
+Adaptive model tiering by request complexity.
+
+Short, simple requests go to the small (fast) model tier; long or
+multi-interest requests go to the large tier. Under load, medium-sized
+requests are also shed to the small tier. Every decision is recorded
+together with per-tier latency and failure counts.
+"""
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any
+
+from .configs import (
+    TIERING_ENABLED,
+    TIER_SMALL_MAX_DAYS,
+    TIER_SMALL_MAX_INTERESTS,
+    TIER_QUEUE_DEPTH_THRESHOLD,
+    TIER_LOAD_SHED_MAX_DAYS,
+)
+from .llm_router import LatencyStats
+
+SMALL = "small"
+LARGE = "large"
+
+# Separators between distinct interests in a free-text preference
+_INTEREST_SPLIT = re.compile(r",|;|/|&|\+|\band\b|\bor\b|\bwith\b", re.IGNORECASE)
+
+
+def count_interests(preference: str) -> int:
+    """Count the distinct interests mentioned in a preference string"""
+    parts = {p.strip().lower() for p in _INTEREST_SPLIT.split(preference or "")}
+    return len([p for p in parts if p])
+
+
+class TierStats:
+    """Per-tier request, failure and latency counters"""
+
+    def __init__(self):
+        self.latency = LatencyStats()
+        self.requests = 0
+        self.failures = 0
+        self.upgrades = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "failure_rate": self.failures / self.requests if self.requests else 0.0,
+            "upgrades": self.upgrades,
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95),
+        }
+
+
+class TieringPolicy:
+    """Pick a model tier from days, preference complexity and queue depth"""
+
+    def __init__(self, history: int = 100):
+        self.enabled = TIERING_ENABLED
+        self.stats = {SMALL: TierStats(), LARGE: TierStats()}
+        self.decisions = deque(maxlen=history)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._in_flight
+
+    @contextmanager
+    def track(self):
+        """Count a request as in flight for queue-depth based decisions"""
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def choose(self, preference: str, days: int) -> str:
+        """Return the tier for a request and record the decision"""
+        interests = count_interests(preference)
+        depth = self.queue_depth
+
+        if not self.enabled:
+            tier, reason = LARGE, "tiering disabled"
+        elif days <= TIER_SMALL_MAX_DAYS and interests <= TIER_SMALL_MAX_INTERESTS:
+            tier, reason = SMALL, "short and simple request"
+        elif depth >= TIER_QUEUE_DEPTH_THRESHOLD and days <= TIER_LOAD_SHED_MAX_DAYS:
+            tier, reason = SMALL, "load shedding"
+        else:
+            tier, reason = LARGE, "long or complex request"
+
+        self.decisions.append({
+            "timestamp": time.time(),
+            "days": days,
+            "interests": interests,
+            "queue_depth": depth,
+            "tier": tier,
+            "reason": reason,
+        })
+        return tier
+
+    def record_result(self, tier: str, latency: float, success: bool):
+        stats = self.stats[tier]
+        stats.requests += 1
+        if success:
+            stats.latency.record_success(latency)
+        else:
+            stats.failures += 1
+            stats.latency.record_error()
+
+    def record_upgrade(self, from_tier: str):
+        self.stats[from_tier].upgrades += 1
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self.queue_depth,
+            "thresholds": {
+                "small_max_days": TIER_SMALL_MAX_DAYS,
+                "small_max_interests": TIER_SMALL_MAX_INTERESTS,
+                "queue_depth_threshold": TIER_QUEUE_DEPTH_THRESHOLD,
+                "load_shed_max_days": TIER_LOAD_SHED_MAX_DAYS,
+            },
+            "tiers": {name: stats.snapshot() for name, stats in self.stats.items()},
+            "recent_decisions": list(self.decisions),
+        }
+
+
+# Create a global instance
+tiering_policy = None
+
+def get_tiering_policy() -> TieringPolicy:
+    """Get or create the tiering policy instance."""
+    global tiering_policy
+    if tiering_policy is None:
+        tiering_policy = TieringPolicy()
+    return tiering_policy
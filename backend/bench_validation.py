@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: compiled itinerary validation vs. the ad hoc helper chain.
+
+Old path: json.loads -> itinerary.validate_itinerary_structure ->
+itinerary.format_itinerary_for_display -> utils.format_itinerary_response.
+New path: itinerary.parse_itinerary (Pydantic TypeAdapter over raw bytes) ->
+itinerary.summarize_itinerary.
+
+The old chain checks only top-level keys and drops accommodations; the
+compiled path type-checks every field, including nested accommodations.
+Timings are roughly on par (within run-to-run noise); the point of the
+compiled path is stricter validation in a single pass, not speed.
+
+Run from the backend directory: python bench_validation.py
+"""
+import json
+import timeit
+
+from app.itinerary import (
+    parse_itinerary,
+    summarize_itinerary,
+    validate_itinerary_structure,
+    format_itinerary_for_display,
+)
+from app.utils import format_itinerary_response
+
+def make_raw_itinerary(days: int) -> bytes:
+    """Build an LLM-shaped itinerary payload with accommodations lists"""
+    itinerary = []
+    for day in range(1, days + 1):
+        itinerary.append({
+            "day": day,
+            "title": f"Day {day} - Exploring Gangtok",
+            "activities": [f"{hour}:00 AM - Activity {i} on day {day}" for i, hour in enumerate(range(8, 13))],
+            "location": ["Gangtok", "Pelling", "Lachung"][day % 3],
+            "description": "Monasteries, viewpoints and local markets with time for rest.",
+            "accommodations": [
+                {"name": "Mayfair Spa Resort & Casino", "url": "https://www.mayfairhotels.com/mayfair-gangtok/"},
+                {"name": "Hotel Sonam Delek", "url": "https://www.sonamdelek.com/"}
+            ]
+        })
+    return json.dumps(itinerary).encode("utf-8")
+
+def old_path(raw: bytes, days: int):
+    data = json.loads(raw)
+    if not validate_itinerary_structure(data):
+        raise ValueError("invalid itinerary")
+    formatted = format_itinerary_for_display(data)
+    return format_itinerary_response(formatted, "culture", days)
+
+def new_path(raw: bytes, days: int):
+    itinerary = parse_itinerary(raw)
+    return {"itinerary": itinerary, **summarize_itinerary(itinerary)}
+
+def main():
+    """Run both paths over several itinerary sizes and print per-call timings"""
+    print("📏 Itinerary validation benchmark (microseconds per call)")
+    print("=" * 60)
+    print(f"{'days':>6} {'old':>12} {'compiled':>12} {'speedup':>10}")
+    for days in (3, 7, 30):
+        raw = make_raw_itinerary(days)
+        number = 2000
+        old = min(timeit.repeat(lambda: old_path(raw, days), number=number, repeat=5)) / number * 1e6
+        new = min(timeit.repeat(lambda: new_path(raw, days), number=number, repeat=5)) / number * 1e6
+        print(f"{days:>6} {old:>12.1f} {new:>12.1f} {old / new:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# test_api.py is a manual script against a running server, not a unit test module
+collect_ignore = ["test_api.py"]
@@ -5,11 +5,25 @@ Startup script for the Sikkim Travel Itinerary API
 
 import uvicorn
 import os
-from app.configs import validate_api_keys, APP_CONFIG
+from dotenv import load_dotenv
 
 def main():
     """Main function to start the FastAPI server"""
     
+    load_dotenv()
+    
+    # Get configuration
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+    workers = max(1, int(os.getenv("WORKERS", "1")))
+    
+    # Workers share caches through a SQLite file; the path must be set before
+    # app.configs is imported so every worker process inherits it
+    if workers > 1 and not os.getenv("SHARED_CACHE_PATH"):
+        os.environ["SHARED_CACHE_PATH"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shared_cache.db")
+    
+    from app.configs import validate_api_keys, APP_CONFIG
+    
     # Validate API keys
     if not validate_api_keys():
         print("⚠️  Warning: Some API keys are missing. The application may not work properly.")
@@ -18,15 +32,19 @@ def main():
         print("- GROQ_API_KEY") 
         print()
     
-    # Get configuration
-    host = os.getenv("HOST", "0.0.0.0")
-    port = int(os.getenv("PORT", "8000"))
     reload = APP_CONFIG.get("debug", False)
+    if reload and workers > 1:
+        print("⚠️  Auto-reload (DEBUG=True) does not support multiple workers, starting 1 worker.")
+        workers = 1
+        # app.configs in the server processes reads WORKERS to split provider budgets
+        os.environ["WORKERS"] = "1"
     
     print(f"🚀 Starting Sikkim Travel Itinerary API...")
     print(f"📍 Server: http://{host}:{port}")
     print(f"📚 API Docs: http://{host}:{port}/docs")
     print(f"🔍 Health Check: http://{host}:{port}/health")
+    if workers > 1:
+        print(f"👥 Workers: {workers} (shared cache: {os.environ['SHARED_CACHE_PATH']})")
     print()
     
     # Start the server
@@ -35,6 +53,7 @@ def main():
         host=host,
         port=port,
         reload=reload,
+        workers=workers,
         log_level="info"
     )
 
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the accommodation catalog and URL checks (app/accommodations.py)
+"""
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+from app import accommodations
+from app.accommodations import AccommodationCatalog, URLValidator, resolve_public_address
+
+
+def fake_getaddrinfo(address):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+    return getaddrinfo
+
+
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.catalog = AccommodationCatalog([
+            {"name": "Mayfair", "location": "Gangtok"},
+            {"name": "Norbugang", "location": "Pelling"},
+            {"name": "Lake Lodge", "location": "Tsomgo Lake"},
+        ])
+
+    def test_resolves_exact_and_prefixed_locations(self):
+        self.assertEqual(self.catalog.resolve_location("Gangtok"), "gangtok")
+        self.assertEqual(self.catalog.resolve_location("Gangtok city centre"), "gangtok")
+
+    def test_resolves_locations_mentioned_in_text(self):
+        self.assertEqual(self.catalog.resolve_location("Day trip to Tsomgo Lake"), "tsomgo lake")
+        self.assertEqual(self.catalog.resolve_location("West Sikkim (Pelling)"), "pelling")
+        self.assertIsNone(self.catalog.resolve_location("Tsomgo"))
+        self.assertIsNone(self.catalog.resolve_location("Lachung"))
+
+
+class ResolvePublicAddressTest(unittest.TestCase):
+    def test_rejects_internal_addresses(self):
+        for address in ("127.0.0.1", "10.0.0.5", "169.254.169.254"):
+            with mock.patch.object(socket, "getaddrinfo", fake_getaddrinfo(address)):
+                self.assertIsNone(resolve_public_address("http://hotel.example/"))
+
+    def test_rejects_non_http_urls(self):
+        self.assertIsNone(resolve_public_address("file:///etc/passwd"))
+
+    def test_returns_the_checked_address(self):
+        with mock.patch.object(socket, "getaddrinfo", fake_getaddrinfo("93.184.216.34")):
+            self.assertEqual(resolve_public_address("https://hotel.example/"), "93.184.216.34")
+
+
+class PinnedRequestTest(unittest.TestCase):
+    def setUp(self):
+        self.hosts = []
+        hosts = self.hosts
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                hosts.append(self.headers["Host"])
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connects_to_the_checked_address_with_the_original_host(self):
+        # The check resolved the host to this address; the request must not resolve it again
+        port = self.server.server_address[1]
+        validator = URLValidator.__new__(URLValidator)
+        validator.timeout = 2
+        real_getaddrinfo = socket.getaddrinfo
+
+        def getaddrinfo(host, *args, **kwargs):
+            if host == "hotel.example":
+                raise AssertionError("host resolved again")
+            return real_getaddrinfo(host, *args, **kwargs)
+
+        with mock.patch.object(accommodations, "resolve_public_address", return_value="127.0.0.1"), \
+                mock.patch.object(socket, "getaddrinfo", getaddrinfo):
+            response = validator._request("HEAD", f"http://hotel.example:{port}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.hosts, [f"hotel.example:{port}"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the circuit breaker state machine (app/circuit_breaker.py)
+"""
+import time
+import unittest
+
+from app.circuit_breaker import CircuitBreaker, slow_call_threshold, CLOSED, OPEN, HALF_OPEN
+
+
+def make_breaker(**kwargs):
+    options = dict(window=10, min_calls=4, error_rate=0.5, slow_call_rate=0.5, open_seconds=60, half_open_calls=1)
+    options.update(kwargs)
+    return CircuitBreaker("test", slow_call_seconds=1.0, **options)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_stays_closed_below_min_calls(self):
+        breaker = make_breaker()
+        for _ in range(3):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_opens_on_error_rate(self):
+        breaker = make_breaker()
+        breaker.record_success(0.1)
+        breaker.record_success(0.1)
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertEqual(breaker.short_circuited, 1)
+
+    def test_opens_on_slow_call_rate(self):
+        breaker = make_breaker()
+        for _ in range(4):
+            breaker.record_success(2.0)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_timeouts_count_as_failures(self):
+        breaker = make_breaker()
+        for _ in range(4):
+            breaker.record_timeout()
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_abandoned_calls_do_not_count(self):
+        breaker = make_breaker()
+        for _ in range(10):
+            breaker.record_abandoned()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.snapshot()["recent_calls"], 0)
+
+    def test_half_open_probe_success_closes(self):
+        breaker = make_breaker(open_seconds=0.05)
+        for _ in range(4):
+            breaker.record_failure()
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success(0.1)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_half_open_probe_failure_reopens(self):
+        breaker = make_breaker(open_seconds=0.05)
+        for _ in range(4):
+            breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker._state, OPEN)
+        self.assertEqual(breaker.trips, 2)
+
+    def test_abandoned_probe_is_given_back(self):
+        breaker = make_breaker(open_seconds=0.05)
+        for _ in range(4):
+            breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_abandoned()
+        self.assertTrue(breaker.allow_request())
+
+    def test_slow_call_threshold_stays_below_stage_timeout(self):
+        # 90s deadline * 0.3 planning share = 27s stage timeout
+        self.assertLess(slow_call_threshold(30.0, 0.3, 0.5), 27.0)
+        self.assertEqual(slow_call_threshold(5.0, 0.3, 0.5), 5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Unit tests for itinerary parsing and validation (app/itinerary.py, TravelAgent._parse_itinerary)
+"""
+import json
+import unittest
+
+from pydantic import ValidationError
+
+from app.agent import TravelAgent
+from app.itinerary import parse_itinerary, summarize_itinerary
+
+
+def make_day(day, **fields):
+    data = {"day": day, "title": f"Day {day}", "activities": ["Visit Rumtek Monastery"], "location": "Gangtok"}
+    data.update(fields)
+    return data
+
+
+class ParseItineraryTest(unittest.TestCase):
+    def test_validates_raw_json(self):
+        raw = json.dumps([make_day(1), make_day(2, location="Pelling")]).encode("utf-8")
+        itinerary = parse_itinerary(raw)
+        self.assertEqual([day["day"] for day in itinerary], [1, 2])
+        self.assertEqual(summarize_itinerary(itinerary), {"total_activities": 2, "locations": ["Gangtok", "Pelling"]})
+
+    def test_normalizes_accommodations_and_activities(self):
+        itinerary = parse_itinerary([
+            make_day(1, activities="Walk MG Marg", accommodation="Hotel Sonam Delek"),
+            make_day(2, accommodations=["Mayfair", {"name": "Elgin", "url": "https://www.elginhotels.com/"}]),
+        ])
+        self.assertEqual(itinerary[0]["activities"], ["Walk MG Marg"])
+        self.assertEqual(itinerary[0]["accommodations"], [{"name": "Hotel Sonam Delek", "url": ""}])
+        self.assertNotIn("accommodation", itinerary[0])
+        self.assertEqual(itinerary[1]["accommodations"][0], {"name": "Mayfair", "url": ""})
+        self.assertEqual(itinerary[1]["description"], "")
+        self.assertEqual(itinerary[1]["activity_count"], 1)
+
+    def test_rejects_invalid_days(self):
+        with self.assertRaises(ValidationError):
+            parse_itinerary(json.dumps([make_day(1, activities=[])]))
+        with self.assertRaises(ValidationError):
+            parse_itinerary(json.dumps([{"day": 1, "title": "No location", "activities": ["x"]}]))
+
+    def test_checks_day_count(self):
+        raw = json.dumps([make_day(1), make_day(2)])
+        self.assertEqual(len(parse_itinerary(raw, days=2)), 2)
+        with self.assertRaises(ValueError):
+            parse_itinerary(raw, days=3)
+
+
+class AgentOutputParseTest(unittest.TestCase):
+    def setUp(self):
+        # Parsing needs no LLM clients
+        self.agent = TravelAgent.__new__(TravelAgent)
+
+    def test_keeps_apostrophes_in_valid_json(self):
+        raw = json.dumps([make_day(1, title="Sikkim's monasteries", activities=["Visit the monks' quarters"])])
+        itinerary, error = self.agent._parse_itinerary(raw, 1)
+        self.assertIsNone(error)
+        self.assertEqual(itinerary[0]["title"], "Sikkim's monasteries")
+        self.assertEqual(itinerary[0]["activities"], ["Visit the monks' quarters"])
+
+    def test_extracts_fenced_json(self):
+        raw = "Here is your trip:\n```json\n" + json.dumps([make_day(1, title="Sikkim's best")]) + "\n```\nEnjoy!"
+        itinerary, error = self.agent._parse_itinerary(raw, 1)
+        self.assertIsNone(error)
+        self.assertEqual(itinerary[0]["title"], "Sikkim's best")
+
+    def test_extracts_json_surrounded_by_text(self):
+        raw = "Final answer: " + json.dumps([make_day(1)]) + " Have a great trip."
+        itinerary, error = self.agent._parse_itinerary(raw)
+        self.assertIsNone(error)
+        self.assertEqual(len(itinerary), 1)
+
+    def test_reports_incomplete_itinerary(self):
+        itinerary, error = self.agent._parse_itinerary(json.dumps([make_day(1)]), 2)
+        self.assertIsNone(itinerary)
+        self.assertIn("expected 2 days", error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for LLM routing: failover, hedging and deadlines (app/llm_router.py)
+"""
+import time
+import unittest
+
+from langchain_core.messages import AIMessage
+
+from app import circuit_breaker, rate_limit
+from app.circuit_breaker import CircuitBreaker, OPEN
+from app.deadline import Deadline, DeadlineExceeded, current_deadline
+from app.llm_router import LLMRouter, LLMBackend, LLMRouterError
+
+
+class FakeModel:
+    def __init__(self, content="ok", delay=0.0, error=None):
+        self.content = content
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return AIMessage(content=self.content)
+
+
+def make_backend(provider, name, model, hedge_delay=0.05):
+    backend = LLMBackend(provider, name)
+    backend._model = model
+    backend.hedge_delay = lambda: hedge_delay
+    return backend
+
+
+class LLMRouterTest(unittest.TestCase):
+    def setUp(self):
+        # Fresh breaker and provider budgets for every test
+        self._breakers = dict(circuit_breaker.breakers)
+        circuit_breaker.breakers["llm"] = CircuitBreaker("llm", 20.0, min_calls=2)
+        self._limiter = rate_limit.rate_limiter
+        rate_limit.rate_limiter = rate_limit.RateLimiter(share=1.0, workers=1)
+
+    def tearDown(self):
+        circuit_breaker.breakers.update(self._breakers)
+        rate_limit.rate_limiter = self._limiter
+
+    def test_returns_first_backend_result(self):
+        primary = FakeModel("a")
+        router = LLMRouter({"large": [make_backend("groq", "a", primary), make_backend("groq", "b", FakeModel("b"))]})
+        self.assertEqual(router.invoke("hi").content, "a")
+
+    def test_fails_over_on_error(self):
+        secondary = FakeModel("b")
+        router = LLMRouter({"large": [
+            make_backend("groq", "a", FakeModel(error=RuntimeError("boom"))),
+            make_backend("groq", "b", secondary),
+        ]})
+        self.assertEqual(router.invoke("hi").content, "b")
+        self.assertEqual(secondary.calls, 1)
+
+    def test_raises_when_every_backend_fails(self):
+        router = LLMRouter({"large": [make_backend("groq", "a", FakeModel(error=RuntimeError("boom")))]})
+        with self.assertRaises(LLMRouterError):
+            router.invoke("hi")
+
+    def test_hedges_slow_call_to_other_provider(self):
+        slow = make_backend("groq", "a", FakeModel("slow", delay=0.5))
+        router = LLMRouter({"large": [slow, make_backend("openai", "b", FakeModel("fast"))]})
+        self.assertEqual(router.invoke("hi").content, "fast")
+        self.assertEqual(slow.stats.hedges, 1)
+
+    def test_does_not_hedge_within_same_provider(self):
+        fallback = FakeModel("b")
+        router = LLMRouter({"large": [
+            make_backend("groq", "a", FakeModel("a", delay=0.2)),
+            make_backend("groq", "b", fallback),
+        ]})
+        self.assertEqual(router.invoke("hi").content, "a")
+        self.assertEqual(fallback.calls, 0)
+
+    def test_tiers_select_backends(self):
+        router = LLMRouter({
+            "small": [make_backend("groq", "s", FakeModel("small"))],
+            "large": [make_backend("groq", "l", FakeModel("large"))],
+        })
+        self.assertEqual(router.invoke("hi").content, "small")
+        self.assertEqual(router.invoke("hi", backends=router.backends_for("large")).content, "large")
+
+    def test_stage_timeout_counts_against_breaker(self):
+        router = LLMRouter({"large": [make_backend("groq", "a", FakeModel(delay=1.0))]})
+        for _ in range(2):
+            token = current_deadline.set(Deadline(0.2))
+            try:
+                with self.assertRaises(DeadlineExceeded):
+                    router.invoke("hi")
+            finally:
+                current_deadline.reset(token)
+        self.assertEqual(circuit_breaker.get_breaker("llm").state, OPEN)
+
+    def test_calls_reserve_provider_budget(self):
+        groq = rate_limit.rate_limiter.providers["groq"]
+        router = LLMRouter({"large": [make_backend("groq", "a", FakeModel())]})
+        router.invoke("hi")
+        router.invoke("hi")
+        self.assertEqual(groq.granted, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
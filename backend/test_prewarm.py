@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pre-warm schedule (app/prewarm.py)
+"""
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from app import prewarm
+
+
+class StopLoop(Exception):
+    pass
+
+
+class OffPeakHoursTest(unittest.TestCase):
+    def test_parses_hour_window(self):
+        self.assertEqual(prewarm.parse_off_peak_hours("1-6"), (1, 6))
+
+    def test_rejects_malformed_spec(self):
+        for spec in ("", "1", "night", "1-25", "a-6"):
+            with self.assertRaises(ValueError):
+                prewarm.parse_off_peak_hours(spec)
+
+    def test_window_may_wrap_midnight(self):
+        self.assertTrue(prewarm.in_off_peak(datetime(2024, 1, 1, 23), "22-4"))
+        self.assertTrue(prewarm.in_off_peak(datetime(2024, 1, 1, 3), "22-4"))
+        self.assertFalse(prewarm.in_off_peak(datetime(2024, 1, 1, 12), "22-4"))
+
+
+class PrewarmLoopTest(unittest.TestCase):
+    def test_loop_passes_refresh_margin(self):
+        with mock.patch.object(prewarm, "run_prewarm") as run, \
+                mock.patch.object(prewarm.time, "sleep", side_effect=StopLoop):
+            with self.assertRaises(StopLoop):
+                prewarm.prewarm_loop(60, ignore_off_peak=True, top_n=5, refresh_margin=120)
+        run.assert_called_once_with(5, 120)
+
+    def test_bad_off_peak_spec_does_not_stop_the_loop(self):
+        with mock.patch.object(prewarm, "in_off_peak", side_effect=ValueError("bad spec")), \
+                mock.patch.object(prewarm.time, "sleep", side_effect=[None, StopLoop]) as sleep:
+            with self.assertRaises(StopLoop):
+                prewarm.prewarm_loop(60)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_background_prewarm_is_not_started_with_a_bad_spec(self):
+        with mock.patch.object(prewarm, "parse_off_peak_hours", side_effect=ValueError("bad spec")), \
+                mock.patch.object(prewarm.threading, "Thread") as thread:
+            self.assertIsNone(prewarm.start_background_prewarm(60))
+        thread.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Unit tests for provider rate limiting and per-client quotas (app/rate_limit.py)
+"""
+import threading
+import time
+import unittest
+
+from app.rate_limit import (
+    TokenBucket,
+    ProviderLimiter,
+    RateLimiter,
+    ClientQuotas,
+    RateLimitExceeded,
+    current_run_budget,
+    INTERACTIVE,
+    BATCH,
+)
+from app.shared_store import MemoryStore
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_starts_full_and_consumes(self):
+        bucket = TokenBucket(60)
+        self.assertEqual(bucket.wait_time(60), 0.0)
+        bucket.consume(60)
+        self.assertGreater(bucket.wait_time(1), 0.0)
+
+    def test_wait_time_reflects_refill_rate(self):
+        bucket = TokenBucket(60)  # one token per second
+        bucket.consume(60)
+        self.assertAlmostEqual(bucket.wait_time(2), 2.0, delta=0.05)
+
+    def test_amount_is_capped_at_capacity(self):
+        bucket = TokenBucket(10)
+        self.assertEqual(bucket.wait_time(1000), 0.0)
+
+    def test_refund_never_exceeds_capacity(self):
+        bucket = TokenBucket(10)
+        bucket.consume(3)
+        bucket.refund(100)
+        self.assertAlmostEqual(bucket.tokens, 10.0, delta=0.01)
+
+
+class ProviderLimiterTest(unittest.TestCase):
+    def test_rejects_when_budget_cannot_arrive_in_time(self):
+        limiter = ProviderLimiter("groq", rpm=1)
+        limiter.acquire(max_wait=0)
+        with self.assertRaises(RateLimitExceeded) as ctx:
+            limiter.acquire(max_wait=0.1)
+        self.assertEqual(ctx.exception.scope, "groq")
+        self.assertGreater(ctx.exception.retry_after, 0.1)
+        self.assertEqual(limiter.rejected, 1)
+
+    def test_token_budget_is_enforced(self):
+        limiter = ProviderLimiter("groq", rpm=100, tpm=1000)
+        limiter.acquire(tokens=900, max_wait=0)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(tokens=900, max_wait=0)
+
+    def test_interactive_waiters_are_served_before_batch(self):
+        # 600 rpm refills one request every 0.1s
+        limiter = ProviderLimiter("groq", rpm=600)
+        limiter.requests.consume(600)
+        order = []
+
+        def waiter(name, priority):
+            limiter.acquire(priority=priority, max_wait=5)
+            order.append(name)
+
+        batch = threading.Thread(target=waiter, args=("batch", BATCH))
+        batch.start()
+        time.sleep(0.02)
+        interactive = threading.Thread(target=waiter, args=("interactive", INTERACTIVE))
+        interactive.start()
+        batch.join(5)
+        interactive.join(5)
+        self.assertEqual(order, ["interactive", "batch"])
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_budget_is_split_between_workers_and_prewarm_share(self):
+        server = RateLimiter(share=0.8, workers=4)
+        prewarm = RateLimiter(share=0.2, workers=1)
+        server_rpm = server.providers["groq"].requests.capacity
+        prewarm_rpm = prewarm.providers["groq"].requests.capacity
+        self.assertLessEqual(4 * server_rpm + prewarm_rpm, RateLimiter(share=1.0, workers=1)
+                             .providers["groq"].requests.capacity)
+
+    def test_unknown_provider_is_not_limited(self):
+        RateLimiter().reserve_llm_call("unknown", 10 ** 9, max_wait=0)
+
+    def test_run_is_rejected_before_its_first_call(self):
+        limiter = RateLimiter(share=1.0, workers=1)
+        groq = limiter.providers["groq"]
+        limiter.admit_run("groq", int(groq.requests.capacity) - 1, 0, max_wait=0)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.admit_run("groq", 3, 0, max_wait=0)
+
+    def test_calls_draw_from_the_admitted_run_budget(self):
+        limiter = RateLimiter(share=1.0, workers=1)
+        groq = limiter.providers["groq"]
+        token = current_run_budget.set(limiter.admit_run("groq", 2, 4000, max_wait=0))
+        try:
+            available = groq.requests.tokens
+            limiter.reserve_llm_call("groq", 1000, max_wait=0)
+            limiter.reserve_llm_call("groq", 1000, max_wait=0)
+            # Both calls were covered by the admission
+            self.assertEqual(groq.granted, 1)
+            self.assertAlmostEqual(groq.requests.tokens, available, delta=0.1)
+            # A third call and a hedge go beyond it and reserve their own budget
+            limiter.reserve_llm_call("groq", 1000, max_wait=0)
+            limiter.reserve_llm_call("groq", 1000, max_wait=0, use_run_budget=False)
+            self.assertEqual(groq.granted, 3)
+        finally:
+            current_run_budget.reset(token)
+
+
+class ClientQuotasTest(unittest.TestCase):
+    def make_quotas(self, store=None):
+        return ClientQuotas(default_rpm=2, overrides={"partner": 5}, api_keys={"mobile"},
+                            store=store or MemoryStore())
+
+    def test_unknown_api_key_does_not_get_a_fresh_quota(self):
+        quotas = self.make_quotas()
+        quotas.check(quotas.client_key("made-up-1", "10.0.0.1"))
+        quotas.check(quotas.client_key("made-up-2", "10.0.0.1"))
+        with self.assertRaises(RateLimitExceeded):
+            quotas.check(quotas.client_key("made-up-3", "10.0.0.1"))
+
+    def test_configured_keys_are_honoured(self):
+        quotas = self.make_quotas()
+        self.assertEqual(quotas.client_key("mobile", "10.0.0.1"), "key:mobile")
+        self.assertEqual(quotas.client_key("partner", "10.0.0.1"), "key:partner")
+        self.assertEqual(quotas.client_key(None, "10.0.0.1"), "ip:10.0.0.1")
+        self.assertEqual(quotas.limit_for("key:partner"), 5)
+        self.assertEqual(quotas.limit_for("key:mobile"), 2)
+
+    def test_override_limit_applies(self):
+        quotas = self.make_quotas()
+        for _ in range(5):
+            quotas.check("key:partner")
+        with self.assertRaises(RateLimitExceeded) as ctx:
+            quotas.check("key:partner")
+        self.assertEqual(ctx.exception.scope, "client")
+        self.assertLessEqual(ctx.exception.retry_after, 60)
+
+    def test_counts_are_shared_between_workers(self):
+        store = MemoryStore()
+        worker_a, worker_b = self.make_quotas(store), self.make_quotas(store)
+        worker_a.check("ip:10.0.0.2")
+        worker_b.check("ip:10.0.0.2")
+        with self.assertRaises(RateLimitExceeded):
+            worker_a.check("ip:10.0.0.2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Unit tests for refinement sessions: target-day parsing, merging and patch validation
+(app/sessions.py, TravelAgent.refine_itinerary)
+"""
+import json
+import unittest
+from unittest import mock
+
+from langchain_core.messages import AIMessage
+
+from app import agent, circuit_breaker
+from app.circuit_breaker import CircuitBreaker, CLOSED
+from app.itinerary import parse_itinerary
+from app.sessions import SessionStore, parse_target_days, merge_days
+from app.shared_store import MemoryStore
+from app.tiering import TieringPolicy, SMALL, LARGE
+
+
+class ParseTargetDaysTest(unittest.TestCase):
+    def test_single_day(self):
+        self.assertEqual(parse_target_days("make day 3 more relaxed", 5), [3])
+
+    def test_lists_and_ranges(self):
+        self.assertEqual(parse_target_days("swap days 2 and 4", 5), [2, 4])
+        self.assertEqual(parse_target_days("redo days 2-4", 5), [2, 3, 4])
+        self.assertEqual(parse_target_days("Day 1, 3 & 5 need trekking", 5), [1, 3, 5])
+
+    def test_ignores_days_outside_the_trip(self):
+        self.assertEqual(parse_target_days("change day 7", 5), [])
+        self.assertEqual(parse_target_days("days 4 to 9", 5), [4, 5])
+
+    def test_no_day_reference(self):
+        self.assertEqual(parse_target_days("more monasteries please", 5), [])
+
+
+class MergeDaysTest(unittest.TestCase):
+    def test_replaces_only_patched_days(self):
+        itinerary = [{"day": 1, "title": "a"}, {"day": 2, "title": "b"}, {"day": 3, "title": "c"}]
+        merged = merge_days(itinerary, [{"day": 2, "title": "new"}])
+        self.assertEqual([day["title"] for day in merged], ["a", "new", "c"])
+
+
+class SessionStoreTest(unittest.TestCase):
+    def test_sessions_are_not_evicted_by_other_cache_entries(self):
+        cache = MemoryStore(max_entries=4)
+        with mock.patch("app.sessions.get_shared_store", return_value=cache):
+            store = SessionStore(ttl=60, max_sessions=2)
+        session = store.create("culture", 2, [{"day": 1}, {"day": 2}])
+        for n in range(10):
+            cache.set("search", str(n), b"results", 60)
+        self.assertEqual(store.get(session["session_id"])["revision"], 0)
+
+    def test_session_count_is_bounded(self):
+        with mock.patch("app.sessions.get_shared_store", return_value=MemoryStore()):
+            store = SessionStore(ttl=60, max_sessions=2)
+        first = store.create("culture", 1, [{"day": 1}])
+        store.create("food", 1, [{"day": 1}])
+        store.create("trekking", 1, [{"day": 1}])
+        self.assertIsNone(store.get(first["session_id"]))
+
+
+class FakeRouter:
+    """Returns canned contents per tier and records which tiers were called"""
+
+    def __init__(self, contents):
+        self.contents = list(contents)
+        self.calls = []
+
+    def backends_for(self, tier):
+        return tier
+
+    def invoke(self, messages, validate=None, backends=None, **kwargs):
+        self.calls.append(backends)
+        # Patch validation belongs to the caller, outside the breaker-counted router call
+        assert validate is None
+        return AIMessage(content=self.contents.pop(0))
+
+
+class RefineItineraryTest(unittest.TestCase):
+    def setUp(self):
+        self.itinerary = parse_itinerary([
+            {"day": d, "title": f"Day {d}", "activities": ["Sightseeing"], "location": "Gangtok"} for d in (1, 2, 3)
+        ])
+        self.good_patch = json.dumps([{"day": 2, "title": "Relaxed day", "activities": ["Spa"], "location": "Gangtok"}])
+        self.agent = agent.TravelAgent.__new__(agent.TravelAgent)
+        self._breakers = dict(circuit_breaker.breakers)
+        circuit_breaker.breakers["llm"] = CircuitBreaker("llm", 20.0, min_calls=1)
+        self.policy = TieringPolicy()
+        self.policy.enabled = True
+
+    def tearDown(self):
+        circuit_breaker.breakers.update(self._breakers)
+
+    def refine(self, router):
+        with mock.patch.object(agent, "get_llm_router", return_value=router), \
+                mock.patch.object(agent, "get_tiering_policy", return_value=self.policy):
+            return self.agent.refine_itinerary("culture", self.itinerary, [2], "make day 2 relaxed")
+
+    def test_merges_valid_patch(self):
+        router = FakeRouter([self.good_patch])
+        result = self.refine(router)
+        self.assertEqual(router.calls, [SMALL])
+        self.assertEqual([day["title"] for day in result["itinerary"]], ["Day 1", "Relaxed day", "Day 3"])
+        self.assertEqual(result["updated_days"], [2])
+
+    def test_invalid_patch_upgrades_without_tripping_breaker(self):
+        wrong_day = json.dumps([{"day": 3, "title": "Wrong", "activities": ["x"], "location": "Gangtok"}])
+        router = FakeRouter([wrong_day, self.good_patch])
+        result = self.refine(router)
+        self.assertEqual(router.calls, [SMALL, LARGE])
+        self.assertEqual(result["model_tier"], LARGE)
+        self.assertEqual(self.policy.stats[SMALL].upgrades, 1)
+        self.assertEqual(self.policy.stats[SMALL].failures, 1)
+        self.assertEqual(circuit_breaker.get_breaker("llm").state, CLOSED)
+
+    def test_invalid_patch_from_large_tier_is_rejected(self):
+        router = FakeRouter(["not json", "still not json"])
+        with self.assertRaises(agent.InvalidPatchError):
+            self.refine(router)
+        self.assertEqual(circuit_breaker.get_breaker("llm").state, CLOSED)
+
+    def test_respects_disabled_tiering(self):
+        self.policy.enabled = False
+        router = FakeRouter([self.good_patch])
+        self.refine(router)
+        self.assertEqual(router.calls, [LARGE])
+        self.assertEqual(self.policy.decisions[-1]["reason"], "tiering disabled")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Unit tests for model tiering and the small->large upgrade (app/tiering.py, TravelAgent.generate_itinerary)
+"""
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from app import agent
+from app.deadline import Deadline
+from app.llm_router import LLMRouterError, current_tier
+from app.rate_limit import RateLimitExceeded
+from app.tiering import TieringPolicy, SMALL, LARGE
+
+ITINERARY = json.dumps([{"day": 1, "title": "Gangtok", "activities": ["MG Marg"], "location": "Gangtok"}])
+
+
+class FakeRouter:
+    def backends_for(self, tier):
+        return [SimpleNamespace(provider="fake")]
+
+
+class FakeExecutor:
+    """Stands in for the agent executor; outcomes are given per tier"""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.tiers = []
+
+    def model_copy(self, update):
+        return self
+
+    def invoke(self, inputs):
+        tier = current_tier.get()
+        self.tiers.append(tier)
+        outcome = self.outcomes[tier]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"output": outcome}
+
+
+class TieringPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.policy = TieringPolicy()
+        self.policy.enabled = True
+
+    def test_short_simple_requests_use_small_tier(self):
+        self.assertEqual(self.policy.choose("monasteries", 2), SMALL)
+        self.assertEqual(self.policy.choose("monasteries, trekking, food and nightlife", 2), LARGE)
+        self.assertEqual(self.policy.choose("monasteries", 10), LARGE)
+
+
+class GenerateItineraryUpgradeTest(unittest.TestCase):
+    def setUp(self):
+        self.policy = TieringPolicy()
+        self.policy.enabled = True
+
+    def generate(self, outcomes):
+        travel_agent = agent.TravelAgent.__new__(agent.TravelAgent)
+        travel_agent.agent_executor = FakeExecutor(outcomes)
+        with mock.patch.object(agent, "get_llm_router", return_value=FakeRouter()), \
+                mock.patch.object(agent, "get_tiering_policy", return_value=self.policy):
+            result = travel_agent.generate_itinerary("monasteries", 1, deadline=Deadline(30))
+        return result, travel_agent.agent_executor.tiers
+
+    def test_upgrades_when_small_tier_backends_fail(self):
+        result, tiers = self.generate({SMALL: LLMRouterError("all backends failed"), LARGE: ITINERARY})
+        self.assertEqual(tiers, [SMALL, LARGE])
+        self.assertTrue(result["success"])
+        self.assertEqual(result["model_tier"], LARGE)
+        self.assertEqual(self.policy.stats[SMALL].failures, 1)
+        self.assertEqual(self.policy.stats[SMALL].upgrades, 1)
+
+    def test_upgrades_when_small_tier_output_is_invalid(self):
+        result, tiers = self.generate({SMALL: "not json", LARGE: ITINERARY})
+        self.assertEqual(tiers, [SMALL, LARGE])
+        self.assertEqual(result["model_tier"], LARGE)
+
+    def test_rate_limit_is_not_a_tier_failure(self):
+        with self.assertRaises(RateLimitExceeded):
+            self.generate({SMALL: RateLimitExceeded("fake", 1.0)})
+        self.assertEqual(self.policy.stats[SMALL].failures, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()